@@ -0,0 +1,656 @@
+#!/opt/srvmon/venv/bin/python3
+"""
+Benchmark the collectors against local stand-ins.
+
+Starts an HTTP server farm for the service checks, a Proxmox API mock, a
+Redfish mock per BMC, an snmpsim agent and optionally a pyghmi IPMI BMC,
+then drives check_services_async, get_proxmox_data, get_all_bmc_data and
+get_all_snmp_data against them at each target count.
+
+Each case runs in its own process so peak RSS is per case. The first round
+is cold (new connections, empty caches); later rounds are warm.
+
+    python bench.py                          # 10, 100 and 1000 targets
+    python bench.py --targets 100 --sections services,bmc --rounds 3
+    python bench.py --latency 0.2 --failure-rate 0.1 > bench_output.txt
+
+IPMI is opt-in (--ipmi). All devices share one fake BMC on UDP 623, and once
+it falls behind, pyghmi's retransmit path can deadlock the IPMI worker
+threads, so cases beyond a few dozen devices may hang until --case-timeout.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import ssl
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from aiohttp import web
+
+SECTIONS = ("services", "proxmox", "bmc", "snmp")
+
+# Loop lag is measured by how late a sleep of this many seconds wakes up
+LAG_INTERVAL = 0.01
+
+# Open sockets are counted from /proc on a thread, so the count doesn't add
+# to the measured loop lag
+SOCKET_SAMPLE_INTERVAL = 0.005
+
+IPMI_PORT = 623
+IPMI_PASSWORD = "bench"
+
+def free_udp_port():
+    """Ask the OS for an unused loopback UDP port for snmpsim."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def raise_fd_limit():
+    """Lift the soft open-file limit to the hard limit; 1000 targets need it."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+# =============================================================================
+# HTTP FARM (services, Proxmox, Redfish)
+# =============================================================================
+
+def delay(args):
+    """Simulated server latency, jittered +/-50%."""
+    return args.latency * random.uniform(0.5, 1.5)
+
+def service_handler(args):
+    async def handle(request):
+        await asyncio.sleep(delay(args))
+        if random.random() < args.failure_rate:
+            return web.Response(status=503)
+        return web.Response(text="ok")
+    return handle
+
+def proxmox_handler(args, targets):
+    nodes = [f"pve{n}" for n in range(max(1, targets // 20))]
+    node_data = [{
+        "type": "node", "id": f"node/{name}", "node": name, "status": "online", "cpu": 0.12, "maxcpu": 32,
+        "mem": 64 * 2**30, "maxmem": 256 * 2**30,
+        "disk": 20 * 2**30, "maxdisk": 100 * 2**30, "uptime": 86400,
+    } for name in nodes]
+    resources = [{
+        "type": "qemu" if vmid % 2 else "lxc", "vmid": 100 + vmid,
+        "name": f"guest{vmid}", "node": nodes[vmid % len(nodes)],
+        "status": "running", "cpu": 0.05, "maxcpu": 4,
+        "mem": 2**30, "maxmem": 4 * 2**30, "disk": 2**30, "maxdisk": 32 * 2**30,
+        "uptime": 3600,
+    } for vmid in range(targets)]
+
+    async def handle(request):
+        await asyncio.sleep(delay(args))
+        if request.path == "/api2/json/cluster/resources":
+            return web.json_response({"data": node_data + resources})
+        return web.Response(status=404)
+    return handle
+
+def redfish_tree(drives):
+    """Resources served by every mock BMC, keyed by path."""
+    storage = "/redfish/v1/Systems/1/Storage/RAID"
+    tree = {
+        "/redfish/v1/": {"ProtocolFeaturesSupported": {
+            "ExpandQuery": {"Levels": True, "NoLinks": True, "MaxLevels": 3}}},
+        "/redfish/v1/Systems/1": {
+            "PowerState": "On", "Status": {"Health": "OK"},
+            "Model": "Bench 1U", "SerialNumber": "BENCH0001"},
+        "/redfish/v1/Chassis/1/Thermal": {
+            "Temperatures": [{"Name": f"CPU{n} Temp", "ReadingCelsius": 40 + n,
+                              "Status": {"Health": "OK"}} for n in range(2)],
+            "Fans": [{"Name": f"Fan{n}", "Reading": 5000 + n * 100,
+                      "Status": {"Health": "OK"}} for n in range(6)]},
+        "/redfish/v1/Chassis/1/Power": {
+            "PowerControl": [{"Name": "System Power", "PowerConsumedWatts": 240}],
+            "Voltages": [{"Name": rail, "ReadingVolts": volts, "Status": {"Health": "OK"}}
+                         for rail, volts in (("12V", 12.1), ("5V", 5.02), ("3.3V", 3.31))]},
+        "/redfish/v1/Managers/1/LogServices/SEL/Entries": {
+            "Members": [{"Id": str(n), "Created": "2024-01-01T00:00:00Z",
+                         "Message": f"Event {n}", "Severity": "OK"} for n in range(20)]},
+        "/redfish/v1/Systems/1/Storage": {"Members": [{"@odata.id": storage}]},
+        storage: {
+            "Name": "RAID Controller", "Status": {"Health": "OK"},
+            "StorageControllers": [{"Model": "Bench RAID", "FirmwareVersion": "1.0"}],
+            "Drives": [{"@odata.id": f"{storage}/Drives/{n}"} for n in range(drives)],
+            "Volumes": {"@odata.id": f"{storage}/Volumes"}},
+        f"{storage}/Volumes": {"Members": [{"@odata.id": f"{storage}/Volumes/0"}]},
+        f"{storage}/Volumes/0": {
+            "Name": "VD0", "CapacityBytes": drives * 4 * 10**12, "RAIDType": "RAID6",
+            "Status": {"Health": "OK"}},
+    }
+    for n in range(drives):
+        tree[f"{storage}/Drives/{n}"] = {
+            "Name": f"Disk {n}", "CapacityBytes": 4 * 10**12, "MediaType": "HDD",
+            "Protocol": "SAS", "Status": {"Health": "OK"}}
+    return tree
+
+def redfish_expand(obj, tree, levels):
+    """Inline referenced resources, as $expand=.($levels=n) does."""
+    if levels == 0:
+        return obj
+    if isinstance(obj, dict):
+        if set(obj) == {"@odata.id"} and obj["@odata.id"] in tree:
+            return redfish_expand(tree[obj["@odata.id"]], tree, levels - 1)
+        return {key: redfish_expand(value, tree, levels) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [redfish_expand(value, tree, levels) for value in obj]
+    return obj
+
+def redfish_handler(args):
+    tree = redfish_tree(args.drives)
+    etags = {}
+
+    async def handle(request):
+        await asyncio.sleep(delay(args) * args.bmc_slowdown)
+        body = tree.get(request.path)
+        if body is None:
+            return web.Response(status=404)
+        if "$expand" in request.query:
+            body = redfish_expand(body, tree, 3)
+        key = request.path_qs
+        if key not in etags:
+            etags[key] = '"%s"' % hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16]
+        if request.headers.get("If-None-Match") == etags[key]:
+            return web.Response(status=304, headers={"ETag": etags[key]})
+        return web.json_response(body, headers={"ETag": etags[key]})
+    return handle
+
+def make_certificate(workdir):
+    """Self-signed certificate for the Redfish mocks, or None without openssl."""
+    if not shutil.which("openssl"):
+        return None
+    cert, key = os.path.join(workdir, "cert.pem"), os.path.join(workdir, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+                    "-keyout", key, "-out", cert, "-days", "1", "-subj", "/CN=localhost"],
+                   check=True, capture_output=True)
+    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ssl_context.load_cert_chain(cert, key)
+    return ssl_context
+
+async def start_farm(args, max_targets, sections, workdir):
+    """Start the HTTP stand-ins. Every service and BMC gets its own port."""
+    runners = []
+    targets = {}
+
+    async def serve(handler, count, ssl_context=None):
+        """Serve handler on count loopback ports and return the ports."""
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        runners.append(runner)
+        ports = []
+        for _ in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(("127.0.0.1", 0))
+            await web.SockSite(runner, sock, ssl_context=ssl_context).start()
+            ports.append(sock.getsockname()[1])
+        return ports
+
+    if "services" in sections:
+        ports = await serve(service_handler(args), max_targets)
+        targets["services"] = [f"http://127.0.0.1:{port}/" for port in ports]
+
+    if "proxmox" in sections:
+        targets["proxmox"] = {}
+        for count in args.targets:
+            port, = await serve(proxmox_handler(args, count), 1)
+            targets["proxmox"][count] = f"http://127.0.0.1:{port}"
+
+    if "bmc" in sections:
+        ssl_context = make_certificate(workdir)
+        if ssl_context is None:
+            print("bmc: skipped, openssl not found", file=sys.stderr)
+        else:
+            ports = await serve(redfish_handler(args), max_targets, ssl_context)
+            targets["bmc"] = [f"127.0.0.1:{port}" for port in ports]
+
+    return runners, targets
+
+# =============================================================================
+# SNMP AGENT (snmpsim)
+# =============================================================================
+
+def snmprec(index, interfaces):
+    """snmpsim dataset for one device: system group, CPUs, storage and interfaces."""
+    records = {
+        "1.3.6.1.2.1.1.1.0": (4, f"Linux bench{index} 6.1.0"),
+        "1.3.6.1.2.1.1.3.0": (67, 8640000 + index),
+        "1.3.6.1.2.1.1.4.0": (4, "ops@example.com"),
+        "1.3.6.1.2.1.1.5.0": (4, f"bench{index}"),
+        "1.3.6.1.2.1.1.6.0": (4, "Bench rack"),
+    }
+    for cpu in range(4):
+        records[f"1.3.6.1.2.1.25.3.3.1.2.{196608 + cpu}"] = (2, 10 + cpu * 5)
+    for row, (type_oid, descr, size, used) in enumerate((
+        ("1.3.6.1.2.1.25.2.1.2", "Physical memory", 16000000, 6000000),
+        ("1.3.6.1.2.1.25.2.1.4", "/", 25000000, 9000000),
+        ("1.3.6.1.2.1.25.2.1.4", "/var", 50000000, 12000000),
+    ), start=1):
+        records[f"1.3.6.1.2.1.25.2.3.1.2.{row}"] = (6, type_oid)
+        records[f"1.3.6.1.2.1.25.2.3.1.3.{row}"] = (4, descr)
+        records[f"1.3.6.1.2.1.25.2.3.1.4.{row}"] = (2, 4096)
+        records[f"1.3.6.1.2.1.25.2.3.1.5.{row}"] = (2, size)
+        records[f"1.3.6.1.2.1.25.2.3.1.6.{row}"] = (2, used)
+    for row in range(1, interfaces + 1):
+        records[f"1.3.6.1.2.1.2.2.1.2.{row}"] = (4, f"eth{row - 1}")
+        records[f"1.3.6.1.2.1.2.2.1.5.{row}"] = (66, 1000000000)
+        records[f"1.3.6.1.2.1.2.2.1.8.{row}"] = (2, 1)
+        records[f"1.3.6.1.2.1.2.2.1.10.{row}"] = (65, 1000000 * row)
+        records[f"1.3.6.1.2.1.2.2.1.16.{row}"] = (65, 2000000 * row)
+        records[f"1.3.6.1.2.1.31.1.1.1.6.{row}"] = (70, 50000000000 * row)
+        records[f"1.3.6.1.2.1.31.1.1.1.10.{row}"] = (70, 70000000000 * row)
+        records[f"1.3.6.1.2.1.31.1.1.1.15.{row}"] = (66, 1000)
+    # snmpsim needs records in OID order
+    ordered = sorted(records, key=lambda oid: tuple(int(part) for part in oid.split(".")))
+    return "".join(f"{oid}|{records[oid][0]}|{records[oid][1]}\n" for oid in ordered)
+
+async def wait_for_snmp(port, community, timeout=120):
+    """Poll the agent until it answers; snmpsim indexes its dataset first."""
+    from pysnmp.hlapi.asyncio import (
+        getCmd, SnmpEngine, CommunityData, UdpTransportTarget, ContextData,
+        ObjectType, ObjectIdentity
+    )
+    engine = SnmpEngine()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        errorIndication, errorStatus, _, _ = await getCmd(
+            engine, CommunityData(community),
+            UdpTransportTarget(("127.0.0.1", port), timeout=1, retries=0),
+            ContextData(), ObjectType(ObjectIdentity("1.3.6.1.2.1.1.1.0")))
+        if not errorIndication and not errorStatus:
+            return True
+        await asyncio.sleep(0.5)
+    return False
+
+async def start_snmpsim(args, max_targets, workdir):
+    """Start snmpsim with one community (data file) per device."""
+    command = shutil.which("snmpsim-command-responder")
+    if not command:
+        print("snmp: skipped, snmpsim not installed (pip install snmpsim)", file=sys.stderr)
+        return None, None
+    data_dir = os.path.join(workdir, "snmp")
+    cache_dir = os.path.join(workdir, "snmp-cache")
+    os.makedirs(data_dir)
+    os.makedirs(cache_dir)
+    for index in range(max_targets):
+        with open(os.path.join(data_dir, f"bench{index}.snmprec"), "w") as f:
+            f.write(snmprec(index, args.interfaces))
+
+    port = free_udp_port()
+    cmd = [command, f"--data-dir={data_dir}", f"--cache-dir={cache_dir}",
+           f"--agent-udpv4-endpoint=127.0.0.1:{port}"]
+    if os.geteuid() == 0:
+        # snmpsim refuses to run as root; the dataset must be readable after the drop
+        cmd += ["--process-user=nobody", "--process-group=nogroup"]
+        for path in (workdir, data_dir, cache_dir):
+            os.chmod(path, 0o777)
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+    if not await wait_for_snmp(port, "bench0"):
+        process.terminate()
+        print("snmp: skipped, snmpsim did not start", file=sys.stderr)
+        return None, None
+    return process, port
+
+# =============================================================================
+# IPMI BMC (pyghmi)
+# =============================================================================
+
+def ipmi_sensor_record(record_id, number, sensor_type, unit, multiplier, name):
+    """Full sensor SDR (IPMI 2.0 table 43-1) for a linear threshold sensor."""
+    body = bytes([
+        0x20, 0x00, number,         # owner, LUN, sensor number
+        0x07, 0x01,                 # entity: system board, instance 1
+        0x7f, 0x68,                 # initialization, capabilities (thresholds readable)
+        sensor_type, 0x01,          # sensor type, threshold reading type
+        0, 0, 0, 0, 0, 0,           # event and reading masks
+        0x00, unit, 0x00,           # unsigned analog, base unit, no modifier
+        0x00,                       # linear
+        multiplier & 0xff, (multiplier >> 8) << 6,
+        0x00, 0x00, 0x00, 0x00,     # B, accuracy
+        0x00,                       # R and B exponents
+        0x00,                       # analog characteristics
+    ]) + bytes(15) + bytes([0xc0 | len(name)]) + name.encode()
+    return struct.pack("<HBBB", record_id, 0x51, 0x01, len(body)) + body
+
+# (sensor type, unit, multiplier, name, raw reading)
+IPMI_SENSORS = [
+    (0x01, 1, 1, "CPU Temp", 45),
+    (0x01, 1, 1, "System Temp", 30),
+    (0x04, 18, 50, "FAN1", 100),
+    (0x04, 18, 50, "FAN2", 98),
+    (0x02, 4, 1, "12V", 12),
+]
+
+def run_ipmi_bmc(port):
+    """Serve a fake BMC with a small SDR repository. Runs until killed."""
+    from pyghmi.ipmi import bmc
+    from pyghmi.ipmi.private import serversession
+
+    class BenchSession(serversession.ServerSession):
+        def create_open_session_response(self, request):
+            # pyghmi's server only implements cipher suite 3 (SHA-1). Reject
+            # SHA-256 like an older BMC would so the client falls back.
+            if request[12] != 1:
+                return bytearray([request[0], 0x11, 0, 0]) + request[4:8]
+            return super().create_open_session_response(request)
+
+        def sessionless_data(self, data, sockaddr):
+            # Retransmitted login packets can land on an established session
+            self.bmc.sessionless_data(data, sockaddr)
+
+    serversession.ServerSession = BenchSession
+
+    records = [ipmi_sensor_record(n, n + 1, sensor_type, unit, multiplier, name)
+               for n, (sensor_type, unit, multiplier, name, _) in enumerate(IPMI_SENSORS)]
+    readings = {n + 1: sensor[4] for n, sensor in enumerate(IPMI_SENSORS)}
+
+    class BenchBmc(bmc.Bmc):
+        def handle_raw_request(self, request, session):
+            netfn, command, data = request["netfn"], request["command"], request["data"]
+            if netfn == 0x0a and command == 0x20:  # Get SDR Repository Info
+                return session.send_ipmi_response(
+                    data=[0x51, len(records), 0, 0xff, 0xff] + [1, 0, 0, 0] * 2 + [0])
+            if netfn == 0x0a and command == 0x22:  # Reserve SDR Repository
+                return session.send_ipmi_response(data=[1, 0])
+            if netfn == 0x0a and command == 0x23:  # Get SDR
+                record_id = data[2] | (data[3] << 8)
+                offset, size = data[4], data[5]
+                next_id = record_id + 1 if record_id + 1 < len(records) else 0xffff
+                chunk = records[record_id][offset:] if size == 0xff else records[record_id][offset:offset + size]
+                return session.send_ipmi_response(data=[next_id & 0xff, next_id >> 8] + list(chunk))
+            if netfn == 0x04 and command == 0x2d:  # Get Sensor Reading
+                return session.send_ipmi_response(data=[readings.get(data[0], 0), 0xc0, 0x00, 0x80])
+            return super().handle_raw_request(request, session)
+
+    class BenchUsers:
+        def get(self, user, default=None):
+            return IPMI_PASSWORD if user.startswith("bench") else default
+
+    server = BenchBmc(BenchUsers(), port=port, address="127.0.0.1")
+    while True:
+        try:
+            server.listen()
+        except Exception:
+            # One malformed exchange must not take the BMC down mid-benchmark
+            continue
+
+async def start_ipmi_bmc():
+    """Start the fake BMC on the standard port, which monitor.py always uses."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(("127.0.0.1", IPMI_PORT))
+    except OSError as e:
+        print(f"ipmi: skipped, cannot bind UDP {IPMI_PORT} ({e.strerror})", file=sys.stderr)
+        return None
+    return await asyncio.create_subprocess_exec(
+        sys.executable, __file__, "--ipmi-bmc", str(IPMI_PORT),
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+
+# =============================================================================
+# WORKER (one case, in its own process)
+# =============================================================================
+
+class CountingSocket(socket.socket):
+    """socket.socket that counts how many were created."""
+    opened = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        CountingSocket.opened += 1
+
+def open_sockets():
+    """Number of open sockets in this process, or None where /proc is missing."""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return None
+    count = 0
+    for fd in fds:
+        try:
+            if os.readlink(f"/proc/self/fd/{fd}").startswith("socket:"):
+                count += 1
+        except OSError:
+            pass
+    return count
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+async def sample_loop_lag(samples):
+    """Record event-loop lag until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples["lag"].append(loop.time() - start - LAG_INTERVAL)
+
+def sample_sockets(samples, stop):
+    """Track the peak number of open sockets until stop is set."""
+    while not stop.wait(SOCKET_SAMPLE_INTERVAL):
+        count = open_sockets()
+        if count is not None:
+            samples["sockets_peak"] = max(samples["sockets_peak"], count)
+
+def configure_monitor(monitor, section, count, spec):
+    """Point the collector for a section at the stand-ins."""
+    if section == "services":
+        monitor.SERVICES = {
+            f"Bench {start // 50}": {f"svc{n}": spec["services"][n]
+                                     for n in range(start, min(start + 50, count))}
+            for start in range(0, count, 50)
+        }
+        return monitor.check_services_async
+    if section == "proxmox":
+        monitor.PROXMOX_CLUSTERS = [{"name": "bench", "host": spec["proxmox"][str(count)],
+                                     "token_id": "bench@pve!bench", "token_secret": "bench"}]
+        return monitor.get_proxmox_data
+    if section == "bmc":
+        monitor.BMC_DEVICES = [{"name": f"bmc{n}", "host": spec["bmc"][n],
+                                "username": "bench", "password": "bench"}
+                               for n in range(count)]
+        return monitor.get_all_bmc_data
+    if section == "snmp":
+        devices = []
+        for n in range(count):
+            device = {"name": f"snmp{n}", "host": "127.0.0.1",
+                      "port": spec["snmp"], "community": f"bench{n}"}
+            if spec["ipmi"]:
+                device["ipmi_username"] = f"bench{n}"
+                device["ipmi_password"] = IPMI_PASSWORD
+            devices.append(device)
+        monitor.SNMP_DEVICES = devices
+        return monitor.get_all_snmp_data
+
+def count_failures(monitor, section, result):
+    """Targets the collector reported as failed."""
+    if section == "services":
+        return sum(1 for status in monitor.STATUS.values() if status["status"] != "up")
+    if section == "proxmox":
+        return sum(1 for cluster in result if cluster["error"])
+    if section == "bmc":
+        return sum(1 for device in result if device["error"])
+    return sum(1 for device in result if device["error"] or device["ipmi_error"])
+
+async def run_case(section, count, rounds, spec):
+    """Run one section at one target count and return a row per round."""
+    socket.socket = CountingSocket
+    import monitor
+
+    collect = configure_monitor(monitor, section, count, spec)
+    rss_base = peak_rss_mb()
+    rows = []
+    for round_number in range(rounds):
+        samples = {"lag": [], "sockets_peak": open_sockets() or 0}
+        stop = threading.Event()
+        socket_sampler = threading.Thread(target=sample_sockets, args=(samples, stop), daemon=True)
+        socket_sampler.start()
+        lag_sampler = asyncio.create_task(sample_loop_lag(samples))
+        sockets_before = CountingSocket.opened
+        start = time.perf_counter()
+        result = await collect()
+        wall = time.perf_counter() - start
+        lag_sampler.cancel()
+        stop.set()
+        socket_sampler.join()
+
+        lag = sorted(samples["lag"]) or [0.0]
+        rows.append({
+            "section": section,
+            "targets": count,
+            "round": "cold" if round_number == 0 else "warm",
+            "wall_s": round(wall, 3),
+            "failed": count_failures(monitor, section, result),
+            "sockets_opened": CountingSocket.opened - sockets_before,
+            "sockets_peak": samples["sockets_peak"],
+            "lag_p99_ms": round(lag[min(len(lag) - 1, int(len(lag) * 0.99))] * 1000, 1),
+            "lag_max_ms": round(lag[-1] * 1000, 1),
+            "rss_base_mb": rss_base,
+            "rss_peak_mb": peak_rss_mb(),
+        })
+
+    await monitor.close_http_sessions()
+    if section == "snmp" and spec["ipmi"]:
+        await asyncio.get_running_loop().run_in_executor(None, monitor.close_ipmi_sessions)
+    return rows
+
+# =============================================================================
+# RUNNER
+# =============================================================================
+
+COLUMNS = [
+    ("section", "section", "{}"),
+    ("targets", "targets", "{}"),
+    ("round", "round", "{}"),
+    ("wall_s", "wall s", "{:.3f}"),
+    ("failed", "failed", "{}"),
+    ("sockets_opened", "sockets", "{}"),
+    ("sockets_peak", "peak open", "{}"),
+    ("lag_p99_ms", "lag p99 ms", "{:.1f}"),
+    ("lag_max_ms", "lag max ms", "{:.1f}"),
+    ("rss_peak_mb", "peak RSS MB", "{:.1f}"),
+]
+
+def print_table(rows):
+    cells = [[label for _, label, _ in COLUMNS]]
+    cells += [[fmt.format(row[key]) for key, _, fmt in COLUMNS] for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(COLUMNS))]
+    for n, line in enumerate(cells):
+        print("  ".join(cell.rjust(width) for cell, width in zip(line, widths)))
+        if n == 0:
+            print("  ".join("-" * width for width in widths))
+
+async def run_worker_process(section, count, args, spec):
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, __file__, "--worker", section, str(count), "--rounds", str(args.rounds),
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(json.dumps(spec).encode()),
+                                           args.case_timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        print(f"{section} x{count}: no result after {args.case_timeout:.0f}s, killed", file=sys.stderr)
+        return []
+    if process.returncode != 0:
+        print(f"{section} x{count}: worker failed (exit {process.returncode})", file=sys.stderr)
+        return []
+    return json.loads(stdout)
+
+async def run_benchmark(args):
+    raise_fd_limit()
+    sections = [section for section in args.sections if section in SECTIONS]
+    max_targets = max(args.targets)
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="srvmon-bench-") as workdir:
+        runners, spec = await start_farm(args, max_targets, sections, workdir)
+        spec["ipmi"] = False
+        try:
+            if "snmp" in sections:
+                snmpsim, spec["snmp"] = await start_snmpsim(args, max_targets, workdir)
+                if snmpsim:
+                    processes.append(snmpsim)
+                    if args.ipmi:
+                        bmc = await start_ipmi_bmc()
+                        if bmc:
+                            processes.append(bmc)
+                            spec["ipmi"] = True
+
+            rows = []
+            for section in sections:
+                if spec.get(section) is None:
+                    continue
+                for count in args.targets:
+                    rows += await run_worker_process(section, count, args, spec)
+        finally:
+            for process in processes:
+                process.terminate()
+                await process.wait()
+            for runner in runners:
+                await runner.cleanup()
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"latency {args.latency * 1000:.0f} ms, failure rate {args.failure_rate:.0%}, "
+              f"{args.rounds} rounds, ipmi {'on' if spec['ipmi'] else 'off'}")
+        print_table(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the collectors against local stand-ins.")
+    parser.add_argument("--targets", default="10,100,1000",
+                        help="comma-separated target counts (default: 10,100,1000)")
+    parser.add_argument("--sections", default=",".join(SECTIONS),
+                        help="comma-separated sections to run (default: all)")
+    parser.add_argument("--rounds", type=int, default=2,
+                        help="polls per case; the first is cold (default: 2)")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="mean simulated server latency in seconds (default: 0.05)")
+    parser.add_argument("--bmc-slowdown", type=float, default=2.0,
+                        help="Redfish latency multiplier (default: 2.0)")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="fraction of service checks answered with 503 (default: 0)")
+    parser.add_argument("--drives", type=int, default=8, help="drives per Redfish BMC (default: 8)")
+    parser.add_argument("--interfaces", type=int, default=4, help="interfaces per SNMP agent (default: 4)")
+    parser.add_argument("--ipmi", action="store_true",
+                        help="also poll a fake IPMI BMC alongside SNMP (needs UDP 623)")
+    parser.add_argument("--case-timeout", type=float, default=900,
+                        help="seconds before a hung case is killed (default: 900)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--worker", nargs=2, metavar=("SECTION", "TARGETS"), help=argparse.SUPPRESS)
+    parser.add_argument("--ipmi-bmc", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.ipmi_bmc:
+        run_ipmi_bmc(args.ipmi_bmc)
+    elif args.worker:
+        raise_fd_limit()
+        spec = json.load(sys.stdin)
+        section, count = args.worker
+        rows = asyncio.run(run_case(section, int(count), args.rounds, spec))
+        json.dump(rows, sys.stdout)
+    else:
+        args.targets = [int(count) for count in args.targets.split(",")]
+        args.sections = args.sections.split(",")
+        asyncio.run(run_benchmark(args))
+
+if __name__ == "__main__":
+    main()
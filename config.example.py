@@ -7,6 +7,17 @@ PROXMOX_TOKEN_ID = "user@pam!tokenname"       # API token ID
 PROXMOX_TOKEN_SECRET = "your-token-secret"    # API token secret
 PROXMOX_VERIFY_SSL = False                    # Set True if using valid SSL cert
 
+# Several Proxmox clusters (optional, replaces the single cluster above)
+# PROXMOX_CLUSTERS = [
+#     {
+#         "name": "Lab",
+#         "host": "https://192.168.1.100:8006",
+#         "token_id": "user@pam!tokenname",
+#         "token_secret": "your-token-secret",
+#         "verify_ssl": False,
+#     },
+# ]
+
 # BMC/Redfish Configuration
 # Add your BMC devices here with per-device credentials
 BMC_DEVICES = [
@@ -36,5 +47,175 @@ SNMP_DEVICES = [
         # Optional IPMI credentials for sensor data
         "ipmi_username": "admin",
         "ipmi_password": "password",
+        # Optional per-device poll interval in seconds
+        "interval": 120,
     },
 ]
+
+# Background collector poll intervals in seconds (optional)
+# Pages render the latest snapshot instantly; these control how fresh it is.
+COLLECTOR_INTERVALS = {
+    "services": 30,
+    "proxmox": 30,
+    "bmc": 60,
+    "snmp": 60,
+}
+
+# Per-target poll scheduling (optional)
+# Failing targets back off exponentially; due polls are spread over stagger
+# seconds and cancelled if still running after deadline seconds.
+SCHEDULER = {
+    "jitter": 0.1,          # Fraction of the interval to randomize by
+    "max_backoff": 600,     # Cap on the backoff delay for failing targets
+    "recovery_probe": 5,    # Re-poll delay after a target recovers
+    "stagger": 1.0,
+    "deadline": 25,
+}
+
+# Shared HTTP connection pool (optional)
+# keepalive_timeout should exceed the longest poll interval so connections
+# are reused across cycles instead of re-handshaking every poll.
+HTTP_POOL = {
+    "limit": 100,
+    "limit_per_host": 4,
+    "keepalive_timeout": 120,
+}
+
+# Poll concurrency limits (optional)
+# Target polls running at once, in total, per subsystem and per destination
+# host. Waiting polls are queued and served fairly across subsystems.
+POLL_CONCURRENCY = {
+    "global": 256,
+    "services": 128,
+    "bmc": 32,
+    "snmp": 32,
+    "per_host": 4,
+}
+
+# Per-service check specs (optional)
+# Keyed by service name. Without a spec a service gets a HEAD request and is up
+# on any status below 400. The body is streamed and reading stops as soon as
+# contains/pattern is decided, or after max_bytes (default 65536).
+SERVICE_CHECKS = {
+    # "GitHub": {
+    #     "method": "GET",          # Default GET with contains/pattern, else HEAD
+    #     "status": (200, 299),     # Status codes that count as up
+    #     "contains": "GitHub",     # Substring the body must contain
+    #     "max_bytes": 16384,
+    #     "cert_days": 14,          # Warn when the certificate expires this soon
+    # },
+    # "OpenAI": {"status": (200, 401), "pattern": r'"error"\s*:'},
+}
+
+# DNS caching for service checks (optional)
+# Answers are cached for their TTL (needs aiodns; otherwise default_ttl).
+DNS_CACHE = {
+    "min_ttl": 5,
+    "max_ttl": 3600,
+    "default_ttl": 60,
+    "negative_ttl": 30,     # Seconds to remember failed lookups
+}
+
+# Max concurrent Redfish requests per BMC (optional)
+REDFISH_MAX_IN_FLIGHT = 4
+
+# Redfish response cache TTLs in seconds (optional)
+# Inventory (storage collections) is served from cache until the TTL expires,
+# then revalidated with If-None-Match. Health (controllers, drives, volumes)
+# and sensor resources are revalidated every poll.
+REDFISH_CACHE_TTL = {
+    "inventory": 600,
+    "health": 0,
+    "sensor": 0,
+}
+
+# SNMP static column cache in seconds (optional)
+# Interface names and speeds, storage sizes and sysDescr/sysContact/sysLocation
+# are walked again after this long, after a reboot or when interfaces change.
+SNMP_STATIC_TTL = 3600
+
+# IPMI polling (optional)
+# Sessions are kept open between polls; IPMI runs on its own thread pool.
+IPMI_MAX_WORKERS = 8
+IPMI_SDR_CACHE_DIR = None  # e.g. "/var/cache/srvmon/sdr" to persist SDRs
+
+# Services per dashboard page (optional)
+DASHBOARD_PAGE_SIZE = 200
+
+# Rendered fragment cache (optional)
+# Tiles and cards are re-rendered only when their data changes.
+FRAGMENT_CACHE = {
+    "max_entries": 10000,
+    "max_bytes": 64 * 1024 * 1024,
+}
+
+# Metric history (optional)
+# Raw samples plus 1-minute and 15-minute aggregates per metric, capped at
+# max_bytes. When full, only series idle for evict_idle_intervals collector
+# intervals are evicted; new series are dropped otherwise. Set path to keep
+# history across restarts in a memory-mapped file.
+HISTORY = {
+    "max_bytes": 128 * 1024 * 1024,
+    "path": None,  # e.g. "/var/lib/srvmon/history.bin"
+    "tiers": [(0, 240), (60, 720), (900, 672)],
+    "evict_idle_intervals": 10,
+}
+
+# Server-Sent Events push stream (optional)
+EVENT_STREAM = {
+    "heartbeat": 15,            # Seconds between keep-alive comments
+    "coalesce": 1.0,            # Seconds to merge rapid updates into one event
+    "max_pending_targets": 500, # Beyond this a client is told to resync
+}
+
+# Poll timing instrumentation (optional)
+# Samples kept per target and phase for the /debug/timings percentiles.
+TIMING_WINDOW = 256
+
+# On-demand polling (optional)
+# Poll a section only when a page or API request asks for it, sharing one
+# poll between concurrent requests and reusing results for fresh_for seconds.
+ON_DEMAND = {
+    "enabled": False,
+    "fresh_for": 10,
+}
+
+# Multi-worker mode (optional)
+# Run several workers, e.g. gunicorn -k uvicorn.workers.UvicornWorker -w 4
+# monitor:app, and set path so only one of them polls. The others serve the
+# leader's snapshots from memory-mapped files there and take over if it exits.
+SHARED_SNAPSHOTS = {
+    "path": None,           # e.g. "/dev/shm/srvmon"
+    "check_interval": 0.5,  # Seconds between checks for new snapshots
+    "max_bytes": 32 * 1024 * 1024,
+}
+
+# Agent mode (optional)
+# Set central to run this install headless at a remote site: it polls its
+# BMC_DEVICES, SNMP_DEVICES and SERVICES and pushes the results to the
+# central instance, which must list this site's token in INGEST.
+AGENT = {
+    "central": None,            # e.g. "https://monitor.example.com"
+    "site": "branch-office",    # Defaults to the hostname
+    "token": "change-me",
+    "verify_ssl": True,
+    "sections": ("services", "bmc", "snmp"),
+    "services": None,           # Service names to check from here; None for all
+    "flush_interval": 2,        # Seconds between batches
+    "heartbeat": 30,            # Send an empty batch after this long without changes
+    "max_batch_targets": 5000,
+    "timeout": 10,
+    "spool_path": "agent-spool",            # Batches waiting for the link to return
+    "spool_max_bytes": 256 * 1024 * 1024,
+}
+
+# Agent ingest on the central instance (optional)
+# Results from each site's agent are merged in: devices appear as
+# "name@site" and each service shows its result per site.
+INGEST = {
+    "tokens": {
+        # "branch-office": "change-me",
+    },
+    "publish_interval": 1,      # Seconds between merging ingested results
+    "max_bytes": 64 * 1024 * 1024,
+}
@@ -1,10 +1,32 @@
 #!/opt/srvmon/venv/bin/python3
 
-from quart import Quart, render_template
+from quart import Quart, abort, make_response, render_template, request, url_for
 import asyncio
 import aiohttp
+import contextvars
+import fcntl
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import math
+import mmap
+import os
+import random
+import re
+import socket
 import ssl
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
+from markupsafe import Markup
+from urllib.parse import urljoin, urlsplit
 
 # Import configuration (copy config.example.py to config.py and add your credentials)
 try:
@@ -16,6 +38,14 @@ except ImportError:
     PROXMOX_TOKEN_SECRET = ""
     PROXMOX_VERIFY_SSL = False
 
+# Proxmox clusters to poll, each a dict with name, host, token_id,
+# token_secret and optionally verify_ssl. Without it the single cluster
+# above is polled.
+try:
+    from config import PROXMOX_CLUSTERS
+except ImportError:
+    PROXMOX_CLUSTERS = []
+
 try:
     from config import BMC_DEVICES
 except ImportError:
@@ -26,9 +56,821 @@ try:
 except ImportError:
     SNMP_DEVICES = []
 
+# Background collector poll intervals in seconds, per section
+COLLECTOR_INTERVALS = {
+    "services": 30,
+    "proxmox": 30,
+    "bmc": 60,
+    "snmp": 60,
+}
+try:
+    from config import COLLECTOR_INTERVALS as _intervals
+    COLLECTOR_INTERVALS.update(_intervals)
+except ImportError:
+    pass
+
+# Per-target poll scheduling. Each target is polled on its section's interval,
+# or its own "interval" key for BMC/SNMP devices, with the next poll time
+# randomized by +/- jitter (a fraction of the interval) so targets drift
+# apart. A target that keeps failing backs off exponentially up to
+# max_backoff seconds; once it answers again it is re-probed after
+# recovery_probe seconds. Targets due together start stagger seconds apart
+# in total, and polls still running deadline seconds into a cycle are
+# cancelled and counted as failures.
+SCHEDULER = {
+    "jitter": 0.1,
+    "max_backoff": 600,
+    "recovery_probe": 5,
+    "stagger": 1.0,
+    "deadline": 25,
+}
+try:
+    from config import SCHEDULER as _scheduler
+    SCHEDULER.update(_scheduler)
+except ImportError:
+    pass
+
+# Limits on target polls running at once: in total, per subsystem and against
+# any one destination host. Polls waiting for a slot queue per subsystem and
+# freed slots are offered to the subsystems in turn, so a backlog of slow
+# BMCs can't starve service checks.
+POLL_CONCURRENCY = {
+    "global": 256,
+    "services": 128,
+    "bmc": 32,
+    "snmp": 32,
+    "per_host": 4,
+}
+try:
+    from config import POLL_CONCURRENCY as _poll_concurrency
+    POLL_CONCURRENCY.update(_poll_concurrency)
+except ImportError:
+    pass
+
+# Max concurrent Redfish requests to a single BMC. BMCs are slow and easily
+# overwhelmed, so the storage crawl queues behind this limit.
+REDFISH_MAX_IN_FLIGHT = 4
+try:
+    from config import REDFISH_MAX_IN_FLIGHT
+except ImportError:
+    pass
+
+# Redfish response cache TTLs in seconds. Sensor resources (system state,
+# Thermal, Power, SEL) and health-bearing storage resources (controllers,
+# drives, volumes) are revalidated every poll; inventory resources (storage
+# and volume collections, service root) are served from cache until the TTL
+# expires. Expired entries are refetched with If-None-Match when the BMC
+# sent an ETag, so an unchanged drive costs a 304.
+REDFISH_CACHE_TTL = {
+    "inventory": 600,
+    "health": 0,
+    "sensor": 0,
+}
+try:
+    from config import REDFISH_CACHE_TTL as _redfish_ttl
+    REDFISH_CACHE_TTL.update(_redfish_ttl)
+except ImportError:
+    pass
+
+# SNMP columns that almost never change (interface names and speeds, storage
+# descriptions and sizes, sysDescr/sysContact/sysLocation) are cached per
+# device and re-walked only after this many seconds, when sysUpTime goes
+# backwards or when the interface or storage rows change.
+SNMP_STATIC_TTL = 3600
+try:
+    from config import SNMP_STATIC_TTL
+except ImportError:
+    pass
+
+# IPMI polling runs on its own thread pool so slow BMCs can't starve other
+# executor work. Set IPMI_SDR_CACHE_DIR to persist SDRs across restarts.
+IPMI_MAX_WORKERS = 8
+IPMI_SDR_CACHE_DIR = None
+try:
+    from config import IPMI_MAX_WORKERS
+except ImportError:
+    pass
+try:
+    from config import IPMI_SDR_CACHE_DIR
+except ImportError:
+    pass
+
+# Metric history. Each series keeps raw samples plus 1-minute and 15-minute
+# aggregates in fixed-size ring buffers; tiers are (bucket seconds, records),
+# 0 meaning raw. max_bytes caps the store. When it's full, a new series
+# replaces the least recently updated one only if that series has gone
+# evict_idle_intervals of the longest collector interval without a sample;
+# otherwise the new series isn't recorded and its samples count as dropped.
+# Set path to back the store with a memory-mapped file so history survives
+# restarts.
+HISTORY = {
+    "max_bytes": 128 * 1024 * 1024,
+    "path": None,
+    "tiers": [(0, 240), (60, 720), (900, 672)],
+    "evict_idle_intervals": 10,
+}
+try:
+    from config import HISTORY as _history_config
+    HISTORY.update(_history_config)
+except ImportError:
+    pass
+
+# Server-Sent Events push stream. Updates arriving within coalesce seconds of
+# each other are merged into one event; a client with more than
+# max_pending_targets unsent changes is told to resync instead.
+EVENT_STREAM = {
+    "heartbeat": 15,
+    "coalesce": 1.0,
+    "max_pending_targets": 500,
+}
+try:
+    from config import EVENT_STREAM as _event_stream
+    EVENT_STREAM.update(_event_stream)
+except ImportError:
+    pass
+
+# Shared HTTP connection pool settings. Idle connections are kept longer than
+# the slowest poll interval so every cycle reuses its keep-alive connections.
+HTTP_POOL = {
+    "limit": 100,             # Max open connections per pool
+    "limit_per_host": 4,      # Max connections to a single host
+    "keepalive_timeout": 120, # Seconds an idle connection is kept open
+}
+try:
+    from config import HTTP_POOL as _http_pool
+    HTTP_POOL.update(_http_pool)
+except ImportError:
+    pass
+
+# Poll timing instrumentation keeps the most recent TIMING_WINDOW samples
+# for each (subsystem, target, phase) series
+TIMING_WINDOW = 256
+try:
+    from config import TIMING_WINDOW
+except ImportError:
+    pass
+
+# DNS caching for service checks. Answers are kept for their record TTL,
+# clamped to min_ttl..max_ttl, and failed lookups for negative_ttl seconds.
+# Without aiodns TTLs are unknown and every answer is kept for default_ttl.
+DNS_CACHE = {
+    "min_ttl": 5,
+    "max_ttl": 3600,
+    "default_ttl": 60,
+    "negative_ttl": 30,
+}
+try:
+    from config import DNS_CACHE as _dns_cache
+    DNS_CACHE.update(_dns_cache)
+except ImportError:
+    pass
+
+# On-demand polling. When enabled, no background collectors run: a page or
+# API request polls its section, concurrent requests for the same section
+# share that one poll, and a result younger than fresh_for seconds is served
+# without polling again. Takes precedence over SHARED_SNAPSHOTS.
+ON_DEMAND = {
+    "enabled": False,
+    "fresh_for": 10,
+}
+try:
+    from config import ON_DEMAND as _on_demand
+    ON_DEMAND.update(_on_demand)
+except ImportError:
+    pass
+
+# Multi-worker mode, for running several server processes (e.g. gunicorn
+# with uvicorn workers). When path is set, the workers elect one collector
+# leader through an exclusive lock in that directory, preferably on tmpfs
+# such as /dev/shm. The leader polls and writes each section's snapshot to
+# a memory-mapped file there; the other workers check it every
+# check_interval seconds and take over polling if the leader exits.
+# max_bytes caps one serialized snapshot. The directory and files must be
+# owned by the user the workers run as. Metric history is then kept in
+# memory per worker and HISTORY["path"] is not used.
+SHARED_SNAPSHOTS = {
+    "path": None,
+    "check_interval": 0.5,
+    "max_bytes": 32 * 1024 * 1024,
+}
+try:
+    from config import SHARED_SNAPSHOTS as _shared_snapshots
+    SHARED_SNAPSHOTS.update(_shared_snapshots)
+except ImportError:
+    pass
+
+# Agent mode, for polling from remote sites. With central set, running
+# monitor.py starts no web server: it polls its sections as usual and every
+# flush_interval seconds posts the targets that changed to the central
+# instance's /api/ingest as gzipped JSON batches of up to max_batch_targets.
+# Batches that can't be delivered are spooled to spool_path and sent in
+# order once the link is back; past spool_max_bytes the oldest are dropped
+# and the central instance asks for a full resync. services limits which
+# SERVICES are checked from this site (None for all).
+AGENT = {
+    "central": None,
+    "site": socket.gethostname(),
+    "token": "",
+    "verify_ssl": True,
+    "sections": ("services", "bmc", "snmp"),
+    "services": None,
+    "flush_interval": 2,
+    "heartbeat": 30,
+    "max_batch_targets": 5000,
+    "timeout": 10,
+    "spool_path": "agent-spool",
+    "spool_max_bytes": 256 * 1024 * 1024,
+}
+try:
+    from config import AGENT as _agent_config
+    AGENT.update(_agent_config)
+except ImportError:
+    pass
+
+# Ingest of agent results on the central instance. tokens maps each site to
+# the bearer token its agent sends; with none the endpoint is disabled.
+# Ingested results are merged into the section snapshots at most every
+# publish_interval seconds. max_bytes caps one decompressed batch.
+INGEST = {
+    "tokens": {},
+    "publish_interval": 1,
+    "max_bytes": 64 * 1024 * 1024,
+}
+try:
+    from config import INGEST as _ingest
+    INGEST.update(_ingest)
+except ImportError:
+    pass
+
+# Rendered HTML fragments (service tiles, device and guest cards) are cached
+# per target and reused until the target's data changes. The least recently
+# used fragments are dropped beyond max_entries or max_bytes.
+FRAGMENT_CACHE = {
+    "max_entries": 10000,
+    "max_bytes": 64 * 1024 * 1024,
+}
+try:
+    from config import FRAGMENT_CACHE as _fragment_cache
+    FRAGMENT_CACHE.update(_fragment_cache)
+except ImportError:
+    pass
+
+# Services shown per page of the dashboard and /api/services listings
+DASHBOARD_PAGE_SIZE = 200
+try:
+    from config import DASHBOARD_PAGE_SIZE
+except ImportError:
+    pass
+
 app = Quart(__name__)
+# Collector and worker events are logged at INFO, below the default WARNING
+app.logger.setLevel(logging.INFO)
+
+
+
+# =============================================================================
+# HTTP CONNECTION POOL
+# =============================================================================
+
+try:
+    import aiodns
+    AIODNS_AVAILABLE = True
+except ImportError:
+    AIODNS_AVAILABLE = False
+
+_ssl_contexts = {}
+_http_sessions = {}
+POOL_STATS = {
+    "requests": 0,
+    "in_flight": 0,
+    "connections_created": 0,
+    "connections_reused": 0,
+    "tls_handshakes": 0,
+    "tls_resumed": 0,
+}
+_pool_counters = {}  # Pool name -> the same counters for that pool's session
+_pool_resolvers = {}  # Pool name -> its CachingResolver, if it has one
+
+# Phase marks of the request currently opening a connection in this task, so
+# the SSL context can note when the TCP connection was up and TLS began
+_connecting_marks = contextvars.ContextVar("connecting_marks", default=None)
+
+# The connection attempt in progress in this task; the SSL context leaves
+# its SSL object here so the pool hooks can count resumed handshakes
+_connecting_tls = contextvars.ContextVar("connecting_tls", default=None)
+
+class PhaseTimingSSLContext(ssl.SSLContext):
+    """SSL context that marks the start of each TLS handshake.
+
+    The SSL object is kept in the marks too, so the peer certificate can be
+    read once the handshake is done. New connections resume the TLS session
+    of the last completed handshake with the same host, skipping the
+    certificate exchange.
+    """
+
+    def __init__(self, protocol):
+        # The protocol is taken by SSLContext.__new__
+        super().__init__()
+        self.last_ssl_objects = {}  # server_hostname -> SSL object
+        self.resumable = {}         # server_hostname -> SSLSession
+
+    def resumable_session(self, server_hostname):
+        """Get the newest session to resume with a host, if any."""
+        ssl_object = self.last_ssl_objects.get(server_hostname)
+        # Read lazily: a TLS 1.3 session ticket arrives after the handshake
+        if ssl_object is not None and ssl_object.session is not None:
+            self.resumable[server_hostname] = ssl_object.session
+        return self.resumable.get(server_hostname)
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        marks = _connecting_marks.get()
+        if marks is not None:
+            marks["tls_start"] = time.perf_counter()
+        if session is None and server_hostname and not server_side:
+            session = self.resumable_session(server_hostname)
+        ssl_object = super().wrap_bio(incoming, outgoing, server_side=server_side,
+                                      server_hostname=server_hostname, session=session)
+        if server_hostname and not server_side:
+            self.last_ssl_objects[server_hostname] = ssl_object
+        if marks is not None:
+            marks["ssl_object"] = ssl_object
+        attempt = _connecting_tls.get()
+        if attempt is not None:
+            attempt["ssl_object"] = ssl_object
+        return ssl_object
+
+def get_ssl_context(verify=True):
+    """Get the shared SSL context for a verify mode, creating it once."""
+    if verify not in _ssl_contexts:
+        ssl_context = PhaseTimingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        ssl_context.load_default_certs()
+        if not verify:
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+        _ssl_contexts[verify] = ssl_context
+    return _ssl_contexts[verify]
+
+def _pool_trace_config(name):
+    """Trace hooks that feed POOL_STATS and the named pool's counters."""
+    counters = _pool_counters.setdefault(name, dict.fromkeys(POOL_STATS, 0))
+
+    def count(key, delta=1):
+        POOL_STATS[key] += delta
+        counters[key] += delta
+
+    async def on_request_start(session, ctx, params):
+        count("requests")
+        count("in_flight")
+
+    async def on_request_done(session, ctx, params):
+        count("in_flight", -1)
+
+    async def on_connection_create_start(session, ctx, params):
+        _connecting_tls.set({})
+
+    async def on_connection_create_end(session, ctx, params):
+        count("connections_created")
+        ssl_object = (_connecting_tls.get() or {}).get("ssl_object")
+        _connecting_tls.set(None)
+        if ssl_object is not None:
+            count("tls_handshakes")
+            if ssl_object.session_reused:
+                count("tls_resumed")
+
+    async def on_connection_reuseconn(session, ctx, params):
+        count("connections_reused")
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_done)
+    trace_config.on_request_exception.append(on_request_done)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace_config
+
+def _phase_hook(mark, connecting=None):
+    """Trace hook recording a timestamp in the request's phase marks.
+
+    Requests opt in by passing a dict as trace_request_ctx.
+    """
+    async def hook(session, ctx, params):
+        marks = ctx.trace_request_ctx
+        if isinstance(marks, dict):
+            marks[mark] = time.perf_counter()
+            if connecting is not None:
+                _connecting_marks.set(marks if connecting else None)
+    return hook
+
+def _phase_trace_config():
+    """Trace hooks that mark DNS, connect, TLS and first-byte times."""
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_phase_hook("start"))
+    trace_config.on_dns_resolvehost_start.append(_phase_hook("dns_start"))
+    trace_config.on_dns_resolvehost_end.append(_phase_hook("dns_end"))
+    trace_config.on_connection_create_start.append(_phase_hook("connect_start", connecting=True))
+    trace_config.on_connection_create_end.append(_phase_hook("connected", connecting=False))
+    trace_config.on_connection_reuseconn.append(_phase_hook("connected"))
+    trace_config.on_request_end.append(_phase_hook("first_byte"))
+    return trace_config
+
+def request_phases(marks):
+    """Turn phase marks into durations in ms: dns, connect, tls and ttfb.
+
+    Phases a request skipped (a reused connection, plain HTTP) are None.
+    """
+    def span(start, end):
+        if start not in marks or end not in marks:
+            return None
+        return round((marks[end] - marks[start]) * 1000, 1)
+
+    dns = span("dns_start", "dns_end")
+    connect = span("connect_start", "tls_start" if "tls_start" in marks else "connected")
+    if connect is not None and dns is not None:
+        connect = round(connect - dns, 1)
+    return {
+        "dns": dns,
+        "connect": connect,
+        "tls": span("tls_start", "connected"),
+        "ttfb": span("connected", "first_byte"),
+        "reused": "connected" in marks and "connect_start" not in marks,
+    }
+
+class CachingResolver(aiohttp.abc.AbstractResolver):
+    """Async DNS resolver that caches answers for their TTL.
+
+    Lookups go through aiodns when installed, which reports record TTLs, and
+    otherwise through getaddrinfo on a thread. Failures are cached too, and
+    concurrent lookups of the same name share one query.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._pending = {}
+        self._aiodns = aiodns.DNSResolver() if AIODNS_AVAILABLE else None
+        self._threaded = aiohttp.ThreadedResolver()
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "failures": 0}
+
+    async def _lookup(self, host, port, family):
+        """Resolve host, returning (results, ttl)."""
+        if self._aiodns is None:
+            return await self._threaded.resolve(host, port, family), DNS_CACHE["default_ttl"]
+        try:
+            response = await self._aiodns.getaddrinfo(host, port=port, family=family,
+                                                      type=socket.SOCK_STREAM)
+        except aiodns.error.DNSError as e:
+            raise OSError(None, e.args[1] if len(e.args) > 1 else "DNS lookup failed") from e
+        results = [{
+            "hostname": host,
+            "host": node.addr[0].decode("ascii"),
+            "port": node.addr[1],
+            "family": node.family,
+            "proto": 0,
+            "flags": socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+        } for node in response.nodes]
+        if not results:
+            raise OSError(None, f"No addresses for {host}")
+        return results, min(node.ttl for node in response.nodes)
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        key = (host, port, family)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            if isinstance(entry[1], OSError):
+                self.stats["negative_hits"] += 1
+                raise OSError(entry[1].errno, entry[1].strerror)
+            self.stats["hits"] += 1
+            return entry[1]
+
+        pending = self._pending.get(key)
+        if pending is None:
+            self.stats["misses"] += 1
+            pending = self._pending[key] = asyncio.ensure_future(self._lookup(host, port, family))
+            try:
+                results, ttl = await asyncio.shield(pending)
+            except OSError as e:
+                self.stats["failures"] += 1
+                self._cache[key] = (time.monotonic() + DNS_CACHE["negative_ttl"], e)
+                raise
+            finally:
+                del self._pending[key]
+            ttl = min(max(ttl, DNS_CACHE["min_ttl"]), DNS_CACHE["max_ttl"])
+            self._cache[key] = (time.monotonic() + ttl, results)
+            return results
+        self.stats["hits"] += 1
+        results, _ = await asyncio.shield(pending)
+        return results
+
+    async def close(self):
+        if self._aiodns is not None:
+            self._aiodns.cancel()
+
+    def get_stats(self):
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "backend": "aiodns" if self._aiodns is not None else "getaddrinfo",
+            "entries": sum(1 for expires, _ in self._cache.values() if expires > now),
+        }
+
+def get_http_session(name, verify_ssl=True):
+    """Get the long-lived pooled session for a collector, creating it on first use."""
+    key = (name, verify_ssl)
+    session = _http_sessions.get(key)
+    if session is None or session.closed:
+        # Service checks hit thousands of names, so they get their own
+        # TTL-honoring resolver in place of the connector's fixed-TTL cache
+        resolver = CachingResolver() if name == "services" else None
+        if resolver is not None:
+            _pool_resolvers[name] = resolver
+        connector = aiohttp.TCPConnector(
+            ssl=get_ssl_context(verify_ssl),
+            limit=HTTP_POOL["limit"],
+            limit_per_host=HTTP_POOL["limit_per_host"],
+            keepalive_timeout=HTTP_POOL["keepalive_timeout"],
+            resolver=resolver,
+            use_dns_cache=resolver is None,
+        )
+        session = aiohttp.ClientSession(connector=connector,
+                                        trace_configs=[_pool_trace_config(name), _phase_trace_config()])
+        _http_sessions[key] = session
+    return session
+
+async def close_http_sessions():
+    """Close all pooled sessions."""
+    for session in _http_sessions.values():
+        await session.close()
+    _http_sessions.clear()
+
+def _reuse_ratio(counters):
+    acquired = counters["connections_created"] + counters["connections_reused"]
+    return round(counters["connections_reused"] / acquired, 3) if acquired else 0
+
+def get_pool_stats():
+    """Summarize connection reuse across all pooled sessions.
+
+    Everything is counted by the sessions' trace hooks; in_flight is the
+    requests still waiting for a response.
+    """
+    pools = {name: {**counters, "reuse_ratio": _reuse_ratio(counters)}
+             for name, counters in _pool_counters.items()}
+    for name, resolver in _pool_resolvers.items():
+        pools.setdefault(name, {})["dns"] = resolver.get_stats()
+    return {
+        **POOL_STATS,
+        "reuse_ratio": _reuse_ratio(POOL_STATS),
+        "ssl_contexts": len(_ssl_contexts),
+        "tls_sessions": sum(len(context.resumable) for context in _ssl_contexts.values()),
+        "pools": pools,
+    }
+
+# =============================================================================
+# POLL TIMINGS
+# =============================================================================
+
+# Histogram bucket upper bounds in seconds
+TIMING_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_timings = {}
+_timings_lock = threading.Lock()
+
+def timing_outcome(exc):
+    """Classify an exception raised by a fetch."""
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    return "error"
+
+def record_timing(subsystem, target, phase, duration, outcome, error=None):
+    """Add one fetch duration to its rolling series. Safe to call from threads."""
+    key = (subsystem, target, phase)
+    with _timings_lock:
+        series = _timings.get(key)
+        if series is None:
+            series = _timings[key] = {
+                "samples": deque(maxlen=TIMING_WINDOW),
+                "count": 0,
+                "last_error": None,
+            }
+        series["samples"].append((duration, outcome))
+        series["count"] += 1
+        if error is not None:
+            series["last_error"] = error
+
+@contextmanager
+def poll_timer(subsystem, target, phase):
+    """Time the enclosed fetch.
+
+    Exceptions escaping the block are recorded as errors or timeouts. Code
+    that handles its own failures sets timer["outcome"] (and optionally
+    timer["error"]) instead.
+    """
+    timer = {"outcome": "ok", "error": None}
+    start = time.perf_counter()
+    try:
+        yield timer
+    except asyncio.CancelledError:
+        timer["outcome"] = "cancelled"
+        raise
+    except Exception as e:
+        timer["outcome"] = timing_outcome(e)
+        timer["error"] = str(e) or type(e).__name__
+        raise
+    finally:
+        record_timing(subsystem, target, phase, time.perf_counter() - start,
+                      timer["outcome"], timer["error"])
+
+def _percentile(durations, q):
+    """Nearest-rank percentile of sorted durations."""
+    return durations[max(0, math.ceil(q * len(durations)) - 1)]
+
+def get_timings():
+    """Summarize every timing series, slowest p99 first. Durations are in ms."""
+    with _timings_lock:
+        snapshot = [(key, list(series["samples"]), series["count"], series["last_error"])
+                    for key, series in _timings.items()]
+
+    rows = []
+    for (subsystem, target, phase), samples, count, last_error in snapshot:
+        durations = sorted(duration for duration, _ in samples)
+        outcomes = {}
+        for _, outcome in samples:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        histogram = [0] * (len(TIMING_BUCKETS) + 1)
+        for duration in durations:
+            bucket = 0
+            while bucket < len(TIMING_BUCKETS) and duration > TIMING_BUCKETS[bucket]:
+                bucket += 1
+            histogram[bucket] += 1
+        rows.append({
+            "subsystem": subsystem,
+            "target": target,
+            "phase": phase,
+            "count": count,
+            "window": len(samples),
+            "p50": round(_percentile(durations, 0.5) * 1000, 1),
+            "p90": round(_percentile(durations, 0.9) * 1000, 1),
+            "p99": round(_percentile(durations, 0.99) * 1000, 1),
+            "max": round(durations[-1] * 1000, 1),
+            "last": round(samples[-1][0] * 1000, 1),
+            "last_outcome": samples[-1][1],
+            "outcomes": outcomes,
+            "histogram": histogram,  # Counts per TIMING_BUCKETS bound, then overflow
+            "last_error": last_error,
+        })
+    rows.sort(key=lambda row: row["p99"], reverse=True)
+    return rows
+
+# =============================================================================
+# POLL CONCURRENCY
+# =============================================================================
+
+# Polls holding a slot, in total and per subsystem and host
+_poll_running = {"total": 0, "subsystems": {}, "hosts": {}}
+# Polls waiting for a slot: {subsystem: {host: deque of futures}}
+_poll_queues = {}
+# Subsystems with waiting polls, in the order they are next offered a slot
+_poll_turns = deque()
+_poll_waits = {}
+
+def _poll_slot_free(subsystem, host):
+    running = _poll_running
+    return (running["total"] < POLL_CONCURRENCY["global"]
+            and running["subsystems"].get(subsystem, 0) < POLL_CONCURRENCY.get(subsystem, POLL_CONCURRENCY["global"])
+            and running["hosts"].get((subsystem, host), 0) < POLL_CONCURRENCY["per_host"])
+
+def _take_poll_slot(subsystem, host):
+    running = _poll_running
+    running["total"] += 1
+    running["subsystems"][subsystem] = running["subsystems"].get(subsystem, 0) + 1
+    running["hosts"][(subsystem, host)] = running["hosts"].get((subsystem, host), 0) + 1
+
+def _release_poll_slot(subsystem, host):
+    running = _poll_running
+    running["total"] -= 1
+    running["subsystems"][subsystem] -= 1
+    running["hosts"][(subsystem, host)] -= 1
+    if not running["hosts"][(subsystem, host)]:
+        del running["hosts"][(subsystem, host)]
+    _grant_poll_slots()
+
+def _grant_poll_slot(subsystem):
+    """Start the longest-waiting poll of a subsystem whose host has room.
+
+    Hosts rotate to the back of the queue once served, so hosts take turns
+    within a subsystem too.
+    """
+    hosts = _poll_queues.get(subsystem, {})
+    for host, waiters in list(hosts.items()):
+        while waiters and waiters[0].done():
+            waiters.popleft()  # Cancelled while waiting
+        if not waiters:
+            del hosts[host]
+            continue
+        if _poll_slot_free(subsystem, host):
+            _take_poll_slot(subsystem, host)
+            waiters.popleft().set_result(None)
+            del hosts[host]
+            if waiters:
+                hosts[host] = waiters
+            return True
+    return False
+
+def _grant_poll_slots():
+    """Hand free slots to waiting polls, taking subsystems in turn."""
+    idle = 0
+    while _poll_turns and idle < len(_poll_turns) and _poll_running["total"] < POLL_CONCURRENCY["global"]:
+        subsystem = _poll_turns[0]
+        _poll_turns.rotate(-1)
+        idle = 0 if _grant_poll_slot(subsystem) else idle + 1
+        if not _poll_queues.get(subsystem):
+            _poll_turns.remove(subsystem)
+            idle = 0
+
+def _record_poll_wait(subsystem, waited):
+    stats = _poll_waits.get(subsystem)
+    if stats is None:
+        stats = _poll_waits[subsystem] = {
+            "started": 0,
+            "queued": 0,
+            "wait_seconds": 0.0,
+            "recent": deque(maxlen=TIMING_WINDOW),
+        }
+    stats["started"] += 1
+    if waited:
+        stats["queued"] += 1
+        stats["wait_seconds"] += waited
+    stats["recent"].append(waited)
+
+@asynccontextmanager
+async def poll_slot(subsystem, host):
+    """Hold one poll slot for subsystem against host, queueing when full."""
+    waiting = _poll_queues.get(subsystem, {}).get(host)
+    if not waiting and _poll_slot_free(subsystem, host):
+        _take_poll_slot(subsystem, host)
+        _record_poll_wait(subsystem, 0.0)
+    else:
+        enqueued = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        waiters = _poll_queues.setdefault(subsystem, {}).setdefault(host, deque())
+        waiters.append(future)
+        if subsystem not in _poll_turns:
+            _poll_turns.append(subsystem)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                if future in waiters:
+                    waiters.remove(future)
+            else:
+                # Granted a slot just as we were cancelled
+                _release_poll_slot(subsystem, host)
+            raise
+        _record_poll_wait(subsystem, time.monotonic() - enqueued)
+    try:
+        yield
+    finally:
+        _release_poll_slot(subsystem, host)
+
+# Per-poll record of the scheduler task running in this context; limited_poll
+# notes in it when the poll got its slot
+_poll_run = contextvars.ContextVar("poll_run", default=None)
 
+async def limited_poll(subsystem, host, fetch, *args):
+    """Run fetch(*args) once a poll slot for subsystem against host is free."""
+    async with poll_slot(subsystem, host):
+        run = _poll_run.get()
+        if run is not None:
+            run["started"] = time.monotonic()
+        return await fetch(*args)
 
+def poll_queue_depth(subsystem):
+    return sum(len(waiters) for waiters in _poll_queues.get(subsystem, {}).values())
+
+def get_poll_concurrency_stats():
+    """Running and queued polls and queue wait times per subsystem, in ms."""
+    subsystems = {}
+    for subsystem in sorted(set(_poll_waits) | set(_poll_queues)):
+        stats = _poll_waits.get(subsystem, {"started": 0, "queued": 0, "wait_seconds": 0.0, "recent": ()})
+        recent = sorted(stats["recent"])
+        subsystems[subsystem] = {
+            "limit": POLL_CONCURRENCY.get(subsystem, POLL_CONCURRENCY["global"]),
+            "running": _poll_running["subsystems"].get(subsystem, 0),
+            "queued": poll_queue_depth(subsystem),
+            "started": stats["started"],
+            "started_after_wait": stats["queued"],
+            "wait_total": round(stats["wait_seconds"] * 1000, 1),
+            "wait_p50": round(_percentile(recent, 0.5) * 1000, 1) if recent else None,
+            "wait_p99": round(_percentile(recent, 0.99) * 1000, 1) if recent else None,
+            "wait_max": round(recent[-1] * 1000, 1) if recent else None,
+        }
+    return {
+        "global_limit": POLL_CONCURRENCY["global"],
+        "per_host_limit": POLL_CONCURRENCY["per_host"],
+        "running": _poll_running["total"],
+        "busy_hosts": sum(1 for count in _poll_running["hosts"].values()
+                          if count >= POLL_CONCURRENCY["per_host"]),
+        "subsystems": subsystems,
+    }
 
 # =============================================================================
 # SERVICES TO MONITOR
@@ -78,99 +920,232 @@ SERVICES = {
     }
 }
 
+# Per-service check specs, keyed by service name. Services without one get a
+# HEAD request and are up on any status below 400. A spec may set:
+#   method     HTTP method (GET when contains or pattern is set, else HEAD)
+#   status     (low, high) range of status codes that count as up
+#   contains   substring the body must contain
+#   pattern    regular expression the body must match
+#   max_bytes  body bytes to read before giving up on a match
+#   cert_days  warn when the TLS certificate expires within this many days
+SERVICE_CHECKS = {}
+try:
+    from config import SERVICE_CHECKS as _service_checks
+    SERVICE_CHECKS.update(_service_checks)
+except ImportError:
+    pass
+
+# Default cap on body bytes read for contains/pattern checks
+SERVICE_CHECK_MAX_BYTES = 65536
+
 STATUS = {}
 
 # =============================================================================
 # SERVICE STATUS CHECKING
 # =============================================================================
 
+# Certificate expiry per host (epoch seconds), from the last TLS handshake.
+# Checks over a reused connection have no handshake of their own.
+_cert_expiry = {}
+
+def cert_days(url, marks):
+    """Days until a host's TLS certificate expires, or None if unknown.
+
+    Read from the handshake recorded in a request's marks, falling back to
+    the host's last handshake. Unverified certificates aren't parsed by ssl,
+    so they report None.
+    """
+    host = urlsplit(url).netloc
+    ssl_object = marks.get("ssl_object")
+    if ssl_object is not None:
+        cert = ssl_object.getpeercert()
+        if cert and "notAfter" in cert:
+            _cert_expiry[host] = ssl.cert_time_to_seconds(cert["notAfter"])
+    if host not in _cert_expiry:
+        return None
+    return round((_cert_expiry[host] - time.time()) / 86400, 1)
+
+async def match_body(response, check):
+    """Stream the body until the check's contains/pattern assertion is decided.
+
+    Substrings are searched chunk by chunk, carrying over just enough of the
+    previous chunk to catch a match across the boundary; patterns are matched
+    against the raw bytes read so far. Reading stops at the first match or
+    after max_bytes, and an unfinished body closes the connection rather than
+    draining it. Returns an error message, or None when the body matched.
+    """
+    needle = check["contains"].encode() if check.get("contains") else None
+    pattern = re.compile(check["pattern"].encode()) if check.get("pattern") else None
+    limit = check.get("max_bytes", SERVICE_CHECK_MAX_BYTES)
+    tail = b""
+    buffer = bytearray()
+    read = 0
+    async for chunk in response.content.iter_any():
+        chunk = chunk[:limit - read]
+        read += len(chunk)
+        if needle is not None:
+            window = tail + chunk
+            if needle in window:
+                needle = None
+            else:
+                tail = window[len(window) - len(needle) + 1:]
+        if pattern is not None:
+            buffer += chunk
+            if pattern.search(buffer):
+                pattern = None
+        if (needle is None and pattern is None) or read >= limit:
+            break
+    if not response.content.at_eof():
+        response.close()
+    if needle is not None:
+        return f"Body does not contain {check['contains']!r}"
+    if pattern is not None:
+        return f"Body does not match {check['pattern']!r}"
+    return None
+
 async def fetch_status(session, name, url):
-    """Fetch the status of a single service."""
-    try:
-        start = asyncio.get_event_loop().time()
-        async with session.head(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-            end = asyncio.get_event_loop().time()
+    """Fetch the status of a single service, applying its SERVICE_CHECKS spec."""
+    check = SERVICE_CHECKS.get(name, {})
+    body_check = "contains" in check or "pattern" in check
+    method = check.get("method", "GET" if body_check else "HEAD").upper()
+    low, high = check.get("status", (100, 399))
+    with poll_timer("services", name, method.lower()) as timer:
+        marks = {}
+        try:
+            start = asyncio.get_event_loop().time()
+            async with session.request(method, url, timeout=aiohttp.ClientTimeout(total=5),
+                                       trace_request_ctx=marks) as response:
+                end = asyncio.get_event_loop().time()
+                days = cert_days(url, marks)
+                check_error = None
+                if not low <= response.status <= high:
+                    timer["outcome"] = "http_error"
+                    check_error = f"Expected status {low}-{high}"
+                elif body_check:
+                    check_error = await match_body(response, check)
+                if check_error is None and days is not None and days <= check.get("cert_days", -math.inf):
+                    check_error = f"Certificate expires in {days:.0f} days"
+                if check_error and timer["outcome"] == "ok":
+                    timer["outcome"] = "check_failed"
+                STATUS[name] = {
+                    "code": response.status,
+                    "status": "warning" if check_error else "up",
+                    "response_time": round((end - start) * 1000),
+                    "phases": request_phases(marks),
+                    "check_error": check_error,
+                    "cert_days": days,
+                }
+        except Exception as e:
+            timer["outcome"] = timing_outcome(e)
+            timer["error"] = str(e) or type(e).__name__
             STATUS[name] = {
-                "code": response.status,
-                "status": "up" if response.status < 400 else "warning",
-                "response_time": round((end - start) * 1000)
+                "code": None,
+                "status": "down",
+                "response_time": None,
+                # Shows how far the check got before failing
+                "phases": request_phases(marks),
+                "check_error": None,
+                "cert_days": None,
             }
-    except Exception:
-        STATUS[name] = {
-            "code": None,
-            "status": "down",
-            "response_time": None
-        }
 
 async def check_services_async():
     """Check all services concurrently."""
+    session = get_http_session("services")
     tasks = []
-    async with aiohttp.ClientSession() as session:
-        for category, services in SERVICES.items():
-            for name, url in services.items():
-                tasks.append(fetch_status(session, name, url))
-        await asyncio.gather(*tasks)
+    for category, services in SERVICES.items():
+        for name, url in services.items():
+            tasks.append(limited_poll("services", urlsplit(url).netloc, fetch_status, session, name, url))
+    await asyncio.gather(*tasks)
 
 # =============================================================================
 # PROXMOX API INTEGRATION
 # =============================================================================
 
-def get_proxmox_headers():
-    """Get authorization headers for Proxmox API."""
+def get_proxmox_clusters():
+    """Get the configured clusters, falling back to the single PROXMOX_HOST."""
+    if PROXMOX_CLUSTERS:
+        return PROXMOX_CLUSTERS
+    if not PROXMOX_HOST:
+        return []
+    return [{
+        "name": urlsplit(PROXMOX_HOST).hostname or PROXMOX_HOST,
+        "host": PROXMOX_HOST,
+        "token_id": PROXMOX_TOKEN_ID,
+        "token_secret": PROXMOX_TOKEN_SECRET,
+        "verify_ssl": PROXMOX_VERIFY_SSL,
+    }]
+
+def get_proxmox_headers(cluster):
+    """Get authorization headers for a cluster's Proxmox API."""
     return {
-        "Authorization": f"PVEAPIToken={PROXMOX_TOKEN_ID}={PROXMOX_TOKEN_SECRET}"
+        "Authorization": f"PVEAPIToken={cluster['token_id']}={cluster['token_secret']}"
     }
 
-def get_ssl_context():
-    """Get SSL context for Proxmox API requests."""
-    if PROXMOX_VERIFY_SSL:
-        return None
-    ssl_context = ssl.create_default_context()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
-    return ssl_context
+async def fetch_proxmox_resources(session, cluster):
+    """Fetch every node, VM and container of a cluster in one request.
 
-async def fetch_proxmox_nodes(session):
-    """Fetch Proxmox cluster nodes status."""
-    try:
-        url = f"{PROXMOX_HOST}/api2/json/nodes"
-        async with session.get(url, headers=get_proxmox_headers(),
-                               ssl=get_ssl_context(),
-                               timeout=aiohttp.ClientTimeout(total=10)) as response:
-            if response.status == 200:
-                data = await response.json()
-                return data.get("data", [])
-            return []
-    except Exception as e:
-        print(f"Error fetching Proxmox nodes: {e}")
-        return []
+    Returns (resources, error).
+    """
+    with poll_timer("proxmox", cluster["name"], "resources") as timer:
+        try:
+            url = f"{cluster['host']}/api2/json/cluster/resources"
+            async with session.get(url, headers=get_proxmox_headers(cluster),
+                                   timeout=aiohttp.ClientTimeout(total=10)) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    return data.get("data", []), None
+                timer["outcome"] = "http_error"
+                timer["error"] = f"HTTP {response.status}"
+                return [], timer["error"]
+        except Exception as e:
+            timer["outcome"] = timing_outcome(e)
+            timer["error"] = str(e) or type(e).__name__
+            return [], timer["error"]
 
-async def fetch_proxmox_resources(session):
-    """Fetch all Proxmox cluster resources (VMs and containers)."""
-    try:
-        url = f"{PROXMOX_HOST}/api2/json/cluster/resources"
-        async with session.get(url, headers=get_proxmox_headers(),
-                               ssl=get_ssl_context(),
-                               timeout=aiohttp.ClientTimeout(total=10)) as response:
-            if response.status == 200:
-                data = await response.json()
-                resources = data.get("data", [])
-                # Filter to only VMs and containers
-                return [r for r in resources if r.get("type") in ("qemu", "lxc")]
-            return []
-    except Exception as e:
-        print(f"Error fetching Proxmox resources: {e}")
-        return []
+async def fetch_proxmox_cluster(cluster):
+    """Poll one cluster and return its processed nodes, VMs and containers."""
+    result = {
+        "name": cluster["name"],
+        "host": cluster["host"],
+        "nodes": [],
+        "vms": [],
+        "containers": [],
+        "error": None,
+    }
+    session = get_http_session("proxmox", verify_ssl=cluster.get("verify_ssl", PROXMOX_VERIFY_SSL))
+    resources, result["error"] = await fetch_proxmox_resources(session, cluster)
+    if result["error"]:
+        return result
+
+    for resource in resources:
+        if resource.get("type") == "node":
+            result["nodes"].append(process_node_data(resource, cluster["name"]))
+        elif resource.get("type") in ("qemu", "lxc"):
+            guest = process_vm_data(resource, cluster["name"])
+            result["vms" if guest["type"] == "qemu" else "containers"].append(guest)
+    result["nodes"].sort(key=lambda x: x["name"])
+    result["vms"].sort(key=lambda x: (x["node"], x["name"]))
+    result["containers"].sort(key=lambda x: (x["node"], x["name"]))
+    if not result["nodes"]:
+        result["error"] = "No nodes returned; check the API token's permissions"
+    return result
+
+def merge_proxmox_clusters(results):
+    """Merge per-cluster results into one view, keeping each cluster's error."""
+    return {
+        "clusters": [{"name": r["name"], "host": r["host"], "error": r["error"]} for r in results],
+        "nodes": [node for r in results for node in r["nodes"]],
+        "vms": [vm for r in results for vm in r["vms"]],
+        "containers": [ct for r in results for ct in r["containers"]],
+    }
 
 async def get_proxmox_data():
-    """Fetch all Proxmox data concurrently."""
-    connector = aiohttp.TCPConnector(ssl=get_ssl_context())
-    async with aiohttp.ClientSession(connector=connector) as session:
-        nodes, vms = await asyncio.gather(
-            fetch_proxmox_nodes(session),
-            fetch_proxmox_resources(session)
-        )
-        return nodes, vms
+    """Poll all clusters concurrently."""
+    clusters = get_proxmox_clusters()
+    return await asyncio.gather(*[
+        limited_poll("proxmox", urlsplit(cluster["host"]).netloc, fetch_proxmox_cluster, cluster)
+        for cluster in clusters
+    ])
 
 def format_bytes(bytes_val):
     """Format bytes to human-readable string."""
@@ -182,7 +1157,7 @@ def format_bytes(bytes_val):
         bytes_val /= 1024
     return f"{bytes_val:.1f} PB"
 
-def process_node_data(node):
+def process_node_data(node, cluster):
     """Process raw node data into display format."""
     mem_used = node.get("mem", 0)
     mem_total = node.get("maxmem", 1)
@@ -192,6 +1167,7 @@ def process_node_data(node):
 
     return {
         "name": node.get("node", "Unknown"),
+        "cluster": cluster,
         "status": "up" if node.get("status") == "online" else "down",
         "uptime": node.get("uptime", 0),
         "cpu_percent": round(cpu * 100, 1),
@@ -203,10 +1179,12 @@ def process_node_data(node):
         "disk_total": format_bytes(disk_total),
     }
 
-def process_vm_data(vm):
+def process_vm_data(vm, cluster):
     """Process raw VM/container data into display format."""
     mem_used = vm.get("mem", 0)
     mem_total = vm.get("maxmem", 1)
+    disk_used = vm.get("disk", 0)
+    disk_total = vm.get("maxdisk", 1)
     cpu = vm.get("cpu", 0)
 
     return {
@@ -215,10 +1193,12 @@ def process_vm_data(vm):
         "type": vm.get("type", "qemu"),
         "status": "up" if vm.get("status") == "running" else "down",
         "node": vm.get("node", "Unknown"),
+        "cluster": cluster,
         "cpu_percent": round(cpu * 100, 1),
         "mem_percent": round((mem_used / mem_total) * 100, 1) if mem_total else 0,
         "mem_used": format_bytes(mem_used),
         "mem_total": format_bytes(mem_total),
+        "disk_percent": round((disk_used / disk_total) * 100, 1) if disk_total else 0,
         "uptime": vm.get("uptime", 0),
     }
 
@@ -226,18 +1206,225 @@ def process_vm_data(vm):
 # BMC/REDFISH INTEGRATION
 # =============================================================================
 
-async def fetch_redfish_endpoint(session, base_url, endpoint, auth):
-    """Fetch data from a Redfish API endpoint."""
+_redfish_limiters = {}
+_redfish_expand_levels = {}
+
+def get_redfish_limiter(host):
+    """Get the semaphore bounding in-flight requests to one BMC."""
+    if host not in _redfish_limiters:
+        _redfish_limiters[host] = asyncio.Semaphore(REDFISH_MAX_IN_FLIGHT)
+    return _redfish_limiters[host]
+
+# Redfish resources whose contents change between polls
+REDFISH_SENSOR_SUFFIXES = ("/Systems/1", "/Thermal", "/Power", "/Entries")
+
+# Storage members carrying a Status.Health that can degrade at any time
+REDFISH_HEALTH_PATH = re.compile(r"/(Storage|Drives|Volumes)/[^/]+$")
+
+_redfish_cache = {}
+REDFISH_CACHE_STATS = {
+    "hits": 0,
+    "misses": 0,
+    "not_modified": 0,
+    "invalidations": 0,
+}
+
+def redfish_cache_kind(url):
+    """Classify a Redfish URL as "sensor", "health" or "inventory"."""
+    path, _, query = url.partition("?")
+    path = path.rstrip("/")
+    if path.endswith(REDFISH_SENSOR_SUFFIXES):
+        return "sensor"
+    # An expanded collection inlines its members' health
+    if "$expand" in query or REDFISH_HEALTH_PATH.search(path):
+        return "health"
+    return "inventory"
+
+def invalidate_redfish_cache(url):
+    """Force revalidation of every cached resource below a changed collection.
+
+    Only inventory resources cascade: sensor and health resources change
+    on their own (system state on every poll) without their children
+    changing, and their children are revalidated or expire anyway.
+    """
+    prefix = url.split("?", 1)[0].rstrip("/") + "/"
+    for key, entry in _redfish_cache.items():
+        if key.startswith(prefix):
+            entry["fetched"] = float("-inf")
+            REDFISH_CACHE_STATS["invalidations"] += 1
+
+async def fetch_redfish_endpoint(session, base_url, endpoint, auth, limiter=None):
+    """Fetch data from a Redfish API endpoint, using the response cache."""
     url = f"{base_url}{endpoint}"
+    entry = _redfish_cache.get(url)
+    if entry and time.monotonic() - entry["fetched"] < REDFISH_CACHE_TTL[entry["kind"]]:
+        REDFISH_CACHE_STATS["hits"] += 1
+        return entry["data"]
+
+    headers = {}
+    if entry and entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+
     try:
-        async with session.get(url, auth=auth, ssl=False,
-                               timeout=aiohttp.ClientTimeout(total=15)) as response:
-            if response.status == 200:
-                return await response.json()
-            return None
+        if limiter is not None:
+            await limiter.acquire()
+        try:
+            # Timed after the limiter so queueing behind other requests to
+            # the same BMC doesn't count against the endpoint
+            host = base_url.split("/")[2]
+            with poll_timer("redfish", host, endpoint.split("?", 1)[0]) as timer:
+                try:
+                    async with session.get(url, auth=auth, headers=headers,
+                                           timeout=aiohttp.ClientTimeout(total=15)) as response:
+                        if response.status == 304 and entry:
+                            timer["outcome"] = "not_modified"
+                            REDFISH_CACHE_STATS["not_modified"] += 1
+                            entry["fetched"] = time.monotonic()
+                            return entry["data"]
+                        if response.status == 200:
+                            data = await response.json()
+                            REDFISH_CACHE_STATS["misses"] += 1
+                            etag = response.headers.get("ETag") or data.get("@odata.etag")
+                            kind = redfish_cache_kind(url)
+                            if (kind == "inventory" and entry
+                                    and (etag != entry["etag"] if etag else data != entry["data"])):
+                                invalidate_redfish_cache(url)
+                            _redfish_cache[url] = {
+                                "data": data,
+                                "etag": etag,
+                                "fetched": time.monotonic(),
+                                "kind": kind,
+                            }
+                            return data
+                        timer["outcome"] = "http_error"
+                        timer["error"] = f"HTTP {response.status}"
+                        return None
+                except Exception as e:
+                    timer["outcome"] = timing_outcome(e)
+                    timer["error"] = str(e) or type(e).__name__
+                    return None
+        finally:
+            if limiter is not None:
+                limiter.release()
     except Exception:
         return None
 
+def get_redfish_cache_stats():
+    """Summarize Redfish cache effectiveness."""
+    lookups = REDFISH_CACHE_STATS["hits"] + REDFISH_CACHE_STATS["misses"] + REDFISH_CACHE_STATS["not_modified"]
+    saved = REDFISH_CACHE_STATS["hits"] + REDFISH_CACHE_STATS["not_modified"]
+    return {
+        **REDFISH_CACHE_STATS,
+        "entries": len(_redfish_cache),
+        "saved_ratio": round(saved / lookups, 3) if lookups else 0,
+    }
+
+async def get_redfish_expand_levels(session, device, auth, limiter):
+    """Get how many $expand levels a BMC supports, 0 if none.
+
+    Read from ProtocolFeaturesSupported on the service root once per BMC.
+    """
+    host = device["host"]
+    if host not in _redfish_expand_levels:
+        root = await fetch_redfish_endpoint(session, f"https://{host}", "/redfish/v1/", auth, limiter)
+        if root is None:
+            return 0  # Try again next poll
+        expand = root.get("ProtocolFeaturesSupported", {}).get("ExpandQuery", {})
+        if expand.get("Levels") and expand.get("NoLinks"):
+            _redfish_expand_levels[host] = expand.get("MaxLevels", 1)
+        else:
+            _redfish_expand_levels[host] = 0
+    return _redfish_expand_levels[host]
+
+async def resolve_redfish_ref(session, host, ref, auth, limiter):
+    """Return a referenced resource, using the inline copy if it was expanded."""
+    if not isinstance(ref, dict):
+        return None
+    if any(key != "@odata.id" for key in ref):
+        return ref
+    url = ref.get("@odata.id", "")
+    if not url:
+        return None
+    return await fetch_redfish_endpoint(session, f"https://{host}", url, auth, limiter)
+
+async def fetch_redfish_storage(session, device, storage_data, auth, limiter):
+    """Crawl storage controllers, drives and volumes concurrently."""
+    host = device["host"]
+    storage = {
+        "controllers": [],
+        "drives": [],
+        "volumes": [],
+    }
+
+    async def crawl_volumes(controller_data):
+        volumes_data = await resolve_redfish_ref(session, host, controller_data.get("Volumes"), auth, limiter)
+        if not volumes_data:
+            return []
+        return await asyncio.gather(*[
+            resolve_redfish_ref(session, host, vol_ref, auth, limiter)
+            for vol_ref in volumes_data.get("Members", [])
+        ])
+
+    async def crawl_controller(member):
+        controller_data = await resolve_redfish_ref(session, host, member, auth, limiter)
+        if not controller_data:
+            return None, [], []
+        drives, volumes = await asyncio.gather(
+            asyncio.gather(*[
+                resolve_redfish_ref(session, host, drive_ref, auth, limiter)
+                for drive_ref in controller_data.get("Drives", [])
+            ]),
+            crawl_volumes(controller_data),
+        )
+        return controller_data, drives, volumes
+
+    crawled = await asyncio.gather(*[crawl_controller(m) for m in storage_data.get("Members", [])])
+
+    for controller_data, drives, volumes in crawled:
+        if not controller_data:
+            continue
+
+        # Controller info
+        controller_health = controller_data.get("Status", {}).get("Health", "Unknown")
+        storage["controllers"].append({
+            "name": controller_data.get("Name", "Storage Controller"),
+            "health": controller_health,
+            "state": "ok" if controller_health == "OK" else "warning" if controller_health == "Warning" else "critical",
+        })
+
+        # Drives
+        for drive_data in drives:
+            if drive_data:
+                drive_health = drive_data.get("Status", {}).get("Health", "Unknown")
+                capacity_bytes = drive_data.get("CapacityBytes", 0)
+                capacity_gb = round(capacity_bytes / (1024**3), 1) if capacity_bytes else 0
+                storage["drives"].append({
+                    "name": drive_data.get("Name", "Unknown Drive"),
+                    "capacity": f"{capacity_gb} GB",
+                    "health": drive_health,
+                    "state": "ok" if drive_health == "OK" else "warning" if drive_health == "Warning" else "critical",
+                    "type": drive_data.get("MediaType", "Unknown"),
+                    "protocol": drive_data.get("Protocol", ""),
+                    "predicted_failure": drive_data.get("PredictedMediaLifeLeftPercent", None),
+                })
+
+        # Volumes
+        for vol_data in volumes:
+            if vol_data:
+                vol_health = vol_data.get("Status", {}).get("Health", "Unknown")
+                vol_capacity = vol_data.get("CapacityBytes", 0)
+                vol_capacity_gb = round(vol_capacity / (1024**3), 1) if vol_capacity else 0
+                raid_types = vol_data.get("RAIDType", "Unknown")
+                storage["volumes"].append({
+                    "name": vol_data.get("Name", "Unknown Volume"),
+                    "capacity": f"{vol_capacity_gb} GB",
+                    "raid": raid_types,
+                    "health": vol_health,
+                    "state": "ok" if vol_health == "OK" else "warning" if vol_health == "Warning" else "critical",
+                })
+
+    return storage
+
 async def fetch_bmc_status(device):
     """Fetch BMC status via Redfish API."""
     base_url = f"https://{device['host']}/redfish/v1"
@@ -266,146 +1453,106 @@ async def fetch_bmc_status(device):
     }
 
     try:
-        connector = aiohttp.TCPConnector(ssl=False)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            # Fetch all data concurrently
-            system_data, thermal_data, power_data, storage_data, sel_data = await asyncio.gather(
-                fetch_redfish_endpoint(session, base_url, "/Systems/1", auth),
-                fetch_redfish_endpoint(session, base_url, "/Chassis/1/Thermal", auth),
-                fetch_redfish_endpoint(session, base_url, "/Chassis/1/Power", auth),
-                fetch_redfish_endpoint(session, base_url, "/Systems/1/Storage", auth),
-                fetch_redfish_endpoint(session, base_url, "/Managers/1/LogServices/SEL/Entries", auth),
-            )
+        session = get_http_session("bmc", verify_ssl=False)
+        limiter = get_redfish_limiter(device["host"])
 
-            # Process system info
-            if system_data:
-                result["power"] = system_data.get("PowerState", "Unknown")
-                result["health"] = system_data.get("Status", {}).get("Health", "Unknown")
-                result["model"] = system_data.get("Model", "")
-                result["serial"] = system_data.get("SerialNumber", "")
-            else:
-                result["error"] = "Unable to connect to Redfish API"
-                return result
-
-            # Process thermal data (temperatures and fans)
-            if thermal_data:
-                # Temperatures
-                for temp in thermal_data.get("Temperatures", []):
-                    if temp.get("ReadingCelsius") is not None:
-                        health = temp.get("Status", {}).get("Health", "OK")
-                        result["sensor_categories"]["temperature"].append({
-                            "name": temp.get("Name", "Unknown"),
-                            "value": temp.get("ReadingCelsius"),
-                            "units": "°C",
-                            "state": "ok" if health == "OK" else "warning" if health == "Warning" else "critical",
-                        })
-                # Fans
-                for fan in thermal_data.get("Fans", []):
-                    reading = fan.get("Reading") or fan.get("ReadingRPM")
-                    if reading is not None:
-                        health = fan.get("Status", {}).get("Health", "OK")
-                        units = fan.get("ReadingUnits", "RPM")
-                        result["sensor_categories"]["fan"].append({
-                            "name": fan.get("Name", "Unknown"),
-                            "value": reading,
-                            "units": units if units else "RPM",
-                            "state": "ok" if health == "OK" else "warning" if health == "Warning" else "critical",
-                        })
-
-            # Process power data
-            if power_data:
-                # Power consumption
-                for pc in power_data.get("PowerControl", []):
-                    watts = pc.get("PowerConsumedWatts")
-                    if watts is not None:
-                        result["sensor_categories"]["power"].append({
-                            "name": pc.get("Name", "Power Consumption"),
-                            "value": watts,
-                            "units": "W",
-                            "state": "ok",
-                        })
-                # Voltages
-                for volt in power_data.get("Voltages", []):
-                    reading = volt.get("ReadingVolts")
-                    if reading is not None:
-                        health = volt.get("Status", {}).get("Health", "OK")
-                        result["sensor_categories"]["voltage"].append({
-                            "name": volt.get("Name", "Unknown"),
-                            "value": reading,
-                            "units": "V",
-                            "state": "ok" if health == "OK" else "warning" if health == "Warning" else "critical",
-                        })
-
-            # Process storage data
-            if storage_data:
-                members = storage_data.get("Members", [])
-                for member in members:
-                    member_url = member.get("@odata.id", "")
-                    if member_url:
-                        controller_data = await fetch_redfish_endpoint(session, f"https://{device['host']}", member_url, auth)
-                        if controller_data:
-                            # Controller info
-                            controller_health = controller_data.get("Status", {}).get("Health", "Unknown")
-                            result["storage"]["controllers"].append({
-                                "name": controller_data.get("Name", "Storage Controller"),
-                                "health": controller_health,
-                                "state": "ok" if controller_health == "OK" else "warning" if controller_health == "Warning" else "critical",
-                            })
-
-                            # Get drives
-                            drives_link = controller_data.get("Drives", [])
-                            for drive_ref in drives_link:
-                                drive_url = drive_ref.get("@odata.id", "")
-                                if drive_url:
-                                    drive_data = await fetch_redfish_endpoint(session, f"https://{device['host']}", drive_url, auth)
-                                    if drive_data:
-                                        drive_health = drive_data.get("Status", {}).get("Health", "Unknown")
-                                        capacity_bytes = drive_data.get("CapacityBytes", 0)
-                                        capacity_gb = round(capacity_bytes / (1024**3), 1) if capacity_bytes else 0
-                                        result["storage"]["drives"].append({
-                                            "name": drive_data.get("Name", "Unknown Drive"),
-                                            "capacity": f"{capacity_gb} GB",
-                                            "health": drive_health,
-                                            "state": "ok" if drive_health == "OK" else "warning" if drive_health == "Warning" else "critical",
-                                            "type": drive_data.get("MediaType", "Unknown"),
-                                            "protocol": drive_data.get("Protocol", ""),
-                                            "predicted_failure": drive_data.get("PredictedMediaLifeLeftPercent", None),
-                                        })
-
-                            # Get volumes
-                            volumes_link = controller_data.get("Volumes", {}).get("@odata.id", "")
-                            if volumes_link:
-                                volumes_data = await fetch_redfish_endpoint(session, f"https://{device['host']}", volumes_link, auth)
-                                if volumes_data:
-                                    for vol_ref in volumes_data.get("Members", []):
-                                        vol_url = vol_ref.get("@odata.id", "")
-                                        if vol_url:
-                                            vol_data = await fetch_redfish_endpoint(session, f"https://{device['host']}", vol_url, auth)
-                                            if vol_data:
-                                                vol_health = vol_data.get("Status", {}).get("Health", "Unknown")
-                                                vol_capacity = vol_data.get("CapacityBytes", 0)
-                                                vol_capacity_gb = round(vol_capacity / (1024**3), 1) if vol_capacity else 0
-                                                raid_types = vol_data.get("RAIDType", "Unknown")
-                                                result["storage"]["volumes"].append({
-                                                    "name": vol_data.get("Name", "Unknown Volume"),
-                                                    "capacity": f"{vol_capacity_gb} GB",
-                                                    "raid": raid_types,
-                                                    "health": vol_health,
-                                                    "state": "ok" if vol_health == "OK" else "warning" if vol_health == "Warning" else "critical",
-                                                })
-
-            # Process SEL entries
-            if sel_data:
-                entries = sel_data.get("Members", [])[-10:]  # Last 10 entries
-                for entry in entries:
-                    severity = entry.get("Severity", "OK")
-                    result["sel_entries"].append({
-                        "id": entry.get("Id", ""),
-                        "timestamp": entry.get("Created", ""),
-                        "message": entry.get("Message", str(entry)),
-                        "severity": "critical" if severity == "Critical" else "warning" if severity == "Warning" else "info",
+        # Expand controllers, drives and volumes inline when the BMC supports it:
+        # Storage collection -> Storage -> Drives/Volumes -> Volume members
+        expand_levels = await get_redfish_expand_levels(session, device, auth, limiter)
+        storage_endpoint = "/Systems/1/Storage"
+        if expand_levels:
+            storage_endpoint += f"?$expand=.($levels={min(expand_levels, 3)})"
+
+        # Fetch all data concurrently
+        system_data, thermal_data, power_data, storage_data, sel_data = await asyncio.gather(
+            fetch_redfish_endpoint(session, base_url, "/Systems/1", auth, limiter),
+            fetch_redfish_endpoint(session, base_url, "/Chassis/1/Thermal", auth, limiter),
+            fetch_redfish_endpoint(session, base_url, "/Chassis/1/Power", auth, limiter),
+            fetch_redfish_endpoint(session, base_url, storage_endpoint, auth, limiter),
+            fetch_redfish_endpoint(session, base_url, "/Managers/1/LogServices/SEL/Entries", auth, limiter),
+        )
+        if storage_data is None and expand_levels:
+            storage_data = await fetch_redfish_endpoint(session, base_url, "/Systems/1/Storage", auth, limiter)
+
+        # Process system info
+        if system_data:
+            result["power"] = system_data.get("PowerState", "Unknown")
+            result["health"] = system_data.get("Status", {}).get("Health", "Unknown")
+            result["model"] = system_data.get("Model", "")
+            result["serial"] = system_data.get("SerialNumber", "")
+        else:
+            result["error"] = "Unable to connect to Redfish API"
+            return result
+
+        # Process thermal data (temperatures and fans)
+        if thermal_data:
+            # Temperatures
+            for i, temp in enumerate(thermal_data.get("Temperatures", [])):
+                if temp.get("ReadingCelsius") is not None:
+                    health = temp.get("Status", {}).get("Health", "OK")
+                    result["sensor_categories"]["temperature"].append({
+                        "id": str(temp.get("MemberId", i)),
+                        "name": temp.get("Name", "Unknown"),
+                        "value": temp.get("ReadingCelsius"),
+                        "units": "°C",
+                        "state": "ok" if health == "OK" else "warning" if health == "Warning" else "critical",
+                    })
+            # Fans
+            for i, fan in enumerate(thermal_data.get("Fans", [])):
+                reading = fan.get("Reading") or fan.get("ReadingRPM")
+                if reading is not None:
+                    health = fan.get("Status", {}).get("Health", "OK")
+                    units = fan.get("ReadingUnits", "RPM")
+                    result["sensor_categories"]["fan"].append({
+                        "id": str(fan.get("MemberId", i)),
+                        "name": fan.get("Name", "Unknown"),
+                        "value": reading,
+                        "units": units if units else "RPM",
+                        "state": "ok" if health == "OK" else "warning" if health == "Warning" else "critical",
                     })
 
+        # Process power data
+        if power_data:
+            # Power consumption
+            for i, pc in enumerate(power_data.get("PowerControl", [])):
+                watts = pc.get("PowerConsumedWatts")
+                if watts is not None:
+                    result["sensor_categories"]["power"].append({
+                        "id": str(pc.get("MemberId", i)),
+                        "name": pc.get("Name", "Power Consumption"),
+                        "value": watts,
+                        "units": "W",
+                        "state": "ok",
+                    })
+            # Voltages
+            for i, volt in enumerate(power_data.get("Voltages", [])):
+                reading = volt.get("ReadingVolts")
+                if reading is not None:
+                    health = volt.get("Status", {}).get("Health", "OK")
+                    result["sensor_categories"]["voltage"].append({
+                        "id": str(volt.get("MemberId", i)),
+                        "name": volt.get("Name", "Unknown"),
+                        "value": reading,
+                        "units": "V",
+                        "state": "ok" if health == "OK" else "warning" if health == "Warning" else "critical",
+                    })
+
+        # Process storage data
+        if storage_data:
+            result["storage"] = await fetch_redfish_storage(session, device, storage_data, auth, limiter)
+
+        # Process SEL entries
+        if sel_data:
+            entries = sel_data.get("Members", [])[-10:]  # Last 10 entries
+            for entry in entries:
+                severity = entry.get("Severity", "OK")
+                result["sel_entries"].append({
+                    "id": entry.get("Id", ""),
+                    "timestamp": entry.get("Created", ""),
+                    "message": entry.get("Message", str(entry)),
+                    "severity": "critical" if severity == "Critical" else "warning" if severity == "Warning" else "info",
+                })
+
     except Exception as e:
         result["error"] = str(e)
 
@@ -416,7 +1563,7 @@ async def get_all_bmc_data():
     if not BMC_DEVICES:
         return []
 
-    tasks = [fetch_bmc_status(device) for device in BMC_DEVICES]
+    tasks = [limited_poll("bmc", device["host"], fetch_bmc_status, device) for device in BMC_DEVICES]
     results = await asyncio.gather(*tasks)
     return results
 
@@ -429,6 +1576,7 @@ try:
         getCmd, bulkCmd, SnmpEngine, CommunityData, UdpTransportTarget,
         ContextData, ObjectType, ObjectIdentity
     )
+    from pysnmp.proto.rfc1905 import NoSuchObject, NoSuchInstance, EndOfMibView
     SNMP_AVAILABLE = True
 except ImportError:
     SNMP_AVAILABLE = False
@@ -440,8 +1588,74 @@ try:
 except ImportError:
     IPMI_AVAILABLE = False
 
-def fetch_ipmi_sensors_sync(host, username, password):
-    """Fetch IPMI sensor data synchronously."""
+_ipmi_executor = None
+_ipmi_sessions = {}
+_ipmi_sessions_lock = threading.Lock()
+
+def get_ipmi_executor():
+    """Get the bounded thread pool used for IPMI polling."""
+    global _ipmi_executor
+    if _ipmi_executor is None:
+        _ipmi_executor = ThreadPoolExecutor(max_workers=IPMI_MAX_WORKERS,
+                                            thread_name_prefix="ipmi")
+    return _ipmi_executor
+
+def get_ipmi_session(host, username, password):
+    """Get the pool entry for a BMC. Its lock serializes use of the session."""
+    key = (host, username, password)
+    with _ipmi_sessions_lock:
+        if key not in _ipmi_sessions:
+            _ipmi_sessions[key] = {
+                "lock": threading.Lock(),
+                "conn": None,
+                "sdr_timestamp": None,
+            }
+        return _ipmi_sessions[key]
+
+def connect_ipmi_session(entry, host, username, password):
+    """Return a logged-in session, reconnecting if it dropped.
+
+    The SDR is kept on the session and only re-read when the repository's
+    add/erase timestamps change.
+    """
+    conn = entry["conn"]
+    if conn is None or conn.ipmi_session.broken:
+        conn = ipmi_command.Command(bmc=host, userid=username, password=password)
+        if IPMI_SDR_CACHE_DIR:
+            conn.set_sdr_cachedir(IPMI_SDR_CACHE_DIR)
+        entry["conn"] = conn
+        entry["sdr_timestamp"] = None
+
+    # Get SDR Repository Info: bytes 5-12 are the last add and erase times
+    repinfo = conn.xraw_command(netfn=0x0a, command=0x20)
+    timestamp = bytes(repinfo["data"][5:13])
+    if timestamp != entry["sdr_timestamp"]:
+        conn._sdr = None
+        entry["sdr_timestamp"] = timestamp
+    return conn
+
+def drop_ipmi_session(entry):
+    """Log out and forget a session."""
+    conn, entry["conn"] = entry["conn"], None
+    if conn is not None:
+        try:
+            conn.ipmi_session.logout()
+        except Exception:
+            pass
+
+def close_ipmi_sessions():
+    """Log out every pooled session and stop the IPMI thread pool."""
+    global _ipmi_executor
+    for entry in list(_ipmi_sessions.values()):
+        with entry["lock"]:
+            drop_ipmi_session(entry)
+    _ipmi_sessions.clear()
+    if _ipmi_executor is not None:
+        _ipmi_executor.shutdown(wait=False, cancel_futures=True)
+        _ipmi_executor = None
+
+def fetch_ipmi_sensors_sync(host, username, password):
+    """Fetch IPMI sensor data synchronously."""
     sensors = {
         "temperature": [],
         "fan": [],
@@ -450,86 +1664,103 @@ def fetch_ipmi_sensors_sync(host, username, password):
     }
     health = "OK"
 
-    try:
-        conn = ipmi_command.Command(bmc=host, userid=username, password=password)
-
-        # Get sensor data - iterate with per-sensor error handling
-        # pyghmi can raise errors during iteration for individual sensors
-        sensor_iter = conn.get_sensor_data()
-        while True:
-            try:
-                sensor = next(sensor_iter)
-            except StopIteration:
-                break
-            except Exception:
-                # Skip sensors that cause errors during iteration
-                continue
+    entry = get_ipmi_session(host, username, password)
+    with entry["lock"], poll_timer("ipmi", host, "sensors") as timer:
+        try:
+            with poll_timer("ipmi", host, "session"):
+                conn = connect_ipmi_session(entry, host, username, password)
 
-            try:
-                name = getattr(sensor, 'name', 'Unknown')
-                value = getattr(sensor, 'value', None)
-                units = getattr(sensor, 'units', '') or ''
-                sensor_type = getattr(sensor, 'type', '') or ''
-                health_val = getattr(sensor, 'health', 0)
-                if health_val is None:
-                    health_val = 0
-                unavailable = getattr(sensor, 'unavailable', False)
-
-                # Skip unavailable sensors
-                if unavailable:
+            # Get sensor data - iterate with per-sensor error handling
+            # pyghmi can raise errors during iteration for individual sensors
+            sensor_iter = conn.get_sensor_data()
+            name_counts = {}
+            while True:
+                try:
+                    sensor = next(sensor_iter)
+                except StopIteration:
+                    break
+                except Exception:
+                    # Skip sensors that cause errors during iteration
                     continue
 
-                # Health is numeric: 0 = ok, non-zero = issue
-                sensor_state = "ok"
-                if health_val != 0:
-                    if health_val >= 2:
-                        sensor_state = "critical"
-                        health = "Critical"
-                    else:
-                        sensor_state = "warning"
-                        if health == "OK":
-                            health = "Warning"
-
-                sensor_entry = {
-                    "name": name,
-                    "value": value,
-                    "units": units,
-                    "state": sensor_state,
-                }
+                try:
+                    name = getattr(sensor, 'name', 'Unknown')
+                    value = getattr(sensor, 'value', None)
+                    units = getattr(sensor, 'units', '') or ''
+                    sensor_type = getattr(sensor, 'type', '') or ''
+                    health_val = getattr(sensor, 'health', 0)
+                    if health_val is None:
+                        health_val = 0
+                    unavailable = getattr(sensor, 'unavailable', False)
 
-                # Categorize by sensor type or name/units
-                type_lower = sensor_type.lower() if sensor_type else ""
-                units_lower = units.lower() if units else ""
-                name_lower = name.lower() if name else ""
-
-                if "temp" in type_lower or "temp" in name_lower or units_lower in ("c", "°c", "celsius"):
-                    sensors["temperature"].append(sensor_entry)
-                elif "fan" in type_lower or "fan" in name_lower or units_lower == "rpm":
-                    sensors["fan"].append(sensor_entry)
-                elif "volt" in type_lower or "volt" in name_lower or units_lower == "v":
-                    sensors["voltage"].append(sensor_entry)
-                elif "power" in type_lower or "watt" in name_lower or "power" in name_lower or units_lower == "w":
-                    sensors["power"].append(sensor_entry)
-            except Exception:
-                # Skip sensors that cause processing errors
-                continue
+                    # Skip unavailable sensors
+                    if unavailable:
+                        continue
 
-        conn.ipmi_session.logout()
-        return sensors, health, None
+                    # Health is numeric: 0 = ok, non-zero = issue
+                    sensor_state = "ok"
+                    if health_val != 0:
+                        if health_val >= 2:
+                            sensor_state = "critical"
+                            health = "Critical"
+                        else:
+                            sensor_state = "warning"
+                            if health == "OK":
+                                health = "Warning"
 
-    except Exception as e:
-        return sensors, "Unknown", str(e)
+                    # Names aren't unique (e.g. one "Temp" per CPU), so a
+                    # sensor is identified by which occurrence of its name
+                    # it is, which holds across polls as sensors come and go
+                    occurrence = name_counts.get(name, 0)
+                    name_counts[name] = occurrence + 1
+                    sensor_entry = {
+                        "id": str(occurrence),
+                        "name": name,
+                        "value": value,
+                        "units": units,
+                        "state": sensor_state,
+                    }
+
+                    # Categorize by sensor type or name/units
+                    type_lower = sensor_type.lower() if sensor_type else ""
+                    units_lower = units.lower() if units else ""
+                    name_lower = name.lower() if name else ""
+
+                    if "temp" in type_lower or "temp" in name_lower or units_lower in ("c", "°c", "celsius"):
+                        sensors["temperature"].append(sensor_entry)
+                    elif "fan" in type_lower or "fan" in name_lower or units_lower == "rpm":
+                        sensors["fan"].append(sensor_entry)
+                    elif "volt" in type_lower or "volt" in name_lower or units_lower == "v":
+                        sensors["voltage"].append(sensor_entry)
+                    elif "power" in type_lower or "watt" in name_lower or "power" in name_lower or units_lower == "w":
+                        sensors["power"].append(sensor_entry)
+                except Exception:
+                    # Skip sensors that cause processing errors
+                    continue
+
+            return sensors, health, None
+
+        except Exception as e:
+            timer["outcome"] = timing_outcome(e)
+            timer["error"] = str(e) or type(e).__name__
+            # Drop the session so the next poll reconnects
+            drop_ipmi_session(entry)
+            return sensors, "Unknown", str(e)
 
 async def fetch_ipmi_sensors(host, username, password):
     """Async wrapper for IPMI sensor fetching."""
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, fetch_ipmi_sensors_sync, host, username, password)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_ipmi_executor(), fetch_ipmi_sensors_sync, host, username, password)
 
 # Standard OIDs
 SNMP_OIDS = {
-    "sysDescr": "1.3.6.1.2.1.1.1.0",
     "sysName": "1.3.6.1.2.1.1.5.0",
     "sysUpTime": "1.3.6.1.2.1.1.3.0",
+}
+
+# Scalars fetched with the static columns
+SNMP_STATIC_OIDS = {
+    "sysDescr": "1.3.6.1.2.1.1.1.0",
     "sysContact": "1.3.6.1.2.1.1.4.0",
     "sysLocation": "1.3.6.1.2.1.1.6.0",
 }
@@ -547,8 +1778,34 @@ SNMP_TABLES = {
     "ifSpeed": "1.3.6.1.2.1.2.2.1.5",             # Interface speed
     "ifInOctets": "1.3.6.1.2.1.2.2.1.10",         # Bytes in
     "ifOutOctets": "1.3.6.1.2.1.2.2.1.16",        # Bytes out
+    "ifHCInOctets": "1.3.6.1.2.1.31.1.1.1.6",     # Bytes in (64-bit)
+    "ifHCOutOctets": "1.3.6.1.2.1.31.1.1.1.10",   # Bytes out (64-bit)
+    "ifHighSpeed": "1.3.6.1.2.1.31.1.1.1.15",     # Interface speed in Mbps
+}
+
+# Columns of the same table are walked together in one GETBULK stream.
+# These are walked every poll...
+SNMP_TABLE_GROUPS = {
+    "processor": ["hrProcessorLoad"],
+    "storage": ["hrStorageUsed"],
+    "interfaces": ["ifOperStatus", "ifInOctets", "ifOutOctets"],
+    "ifx": ["ifHCInOctets", "ifHCOutOctets"],
+}
+
+# ...and these only when a device's static cache is refreshed
+SNMP_STATIC_TABLE_GROUPS = {
+    "storage": ["hrStorageDescr", "hrStorageType", "hrStorageAllocationUnits", "hrStorageSize"],
+    "interfaces": ["ifDescr", "ifSpeed"],
+    "ifx": ["ifHighSpeed"],
 }
 
+# Varbinds asked for per GETBULK request. Narrower walks get more
+# repetitions, so walking fewer columns also takes fewer round trips.
+SNMP_BULK_VARBINDS = 125
+
+def snmp_repetitions(columns):
+    return max(1, SNMP_BULK_VARBINDS // len(columns))
+
 def format_uptime(timeticks):
     """Convert SNMP timeticks (1/100 seconds) to human-readable format."""
     if timeticks is None:
@@ -577,6 +1834,16 @@ def format_speed(speed_bps):
         return f"{speed_bps // 1000} Kbps"
     return f"{speed_bps} bps"
 
+def format_bps(bps):
+    """Format a bit rate to human-readable format."""
+    if bps is None:
+        return "--"
+    for unit in ['bps', 'Kbps', 'Mbps', 'Gbps']:
+        if bps < 1000:
+            return f"{bps:.1f} {unit}"
+        bps /= 1000
+    return f"{bps:.1f} Tbps"
+
 def format_octets(octets):
     """Format octet count to human-readable format."""
     if octets is None:
@@ -587,66 +1854,269 @@ def format_octets(octets):
         octets /= 1024
     return f"{octets:.1f} PB"
 
+_snmp_engine = None
+_snmp_engine_loop = None
+_snmp_transports = {}
+
+def get_snmp_engine():
+    """Get the process-wide SNMP engine, creating it on first use.
+
+    The engine's dispatcher is bound to the event loop it first ran on, so a
+    new engine (and fresh transports) is created if the loop ever changes.
+    """
+    global _snmp_engine, _snmp_engine_loop
+    loop = asyncio.get_running_loop()
+    if _snmp_engine is None or _snmp_engine_loop is not loop:
+        _snmp_engine = SnmpEngine()
+        _snmp_engine_loop = loop
+        _snmp_transports.clear()
+    return _snmp_engine
+
+def get_snmp_transport(host, port):
+    """Get the cached UDP transport target for a device."""
+    key = (host, port)
+    if key not in _snmp_transports:
+        _snmp_transports[key] = UdpTransportTarget((host, port), timeout=5, retries=1)
+    return _snmp_transports[key]
+
+def snmp_value(value):
+    """Render an SNMP value as a string."""
+    return value.prettyPrint() if hasattr(value, 'prettyPrint') else str(value)
+
+# Most scalar OIDs packed into one GET PDU. Lowered per device when an agent
+# answers tooBig, so later polls start at a size the agent accepts.
+SNMP_MAX_GET_OIDS = 32
+SNMP_ERROR_TOO_BIG = 1
+_snmp_get_limits = {}
+
+def snmp_outcome(error):
+    """Classify an SNMP error indication or exception for poll timings."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or "timeout" in str(error).lower():
+        return "timeout"
+    return "error"
+
+async def _snmp_get_batch(host, port, community, items, results):
+    """GET a batch of (name, oid) pairs in one PDU, splitting on tooBig."""
+    errorIndication, errorStatus, errorIndex, varBinds = await getCmd(
+        get_snmp_engine(),
+        CommunityData(community),
+        get_snmp_transport(host, port),
+        ContextData(),
+        *[ObjectType(ObjectIdentity(oid)) for _, oid in items]
+    )
+    if errorIndication:
+        raise RuntimeError(str(errorIndication))
+
+    if errorStatus:
+        if int(errorStatus) == SNMP_ERROR_TOO_BIG and len(items) > 1:
+            half = len(items) // 2
+            limit = _snmp_get_limits.get((host, port), SNMP_MAX_GET_OIDS)
+            _snmp_get_limits[(host, port)] = min(limit, half)
+            await asyncio.gather(
+                _snmp_get_batch(host, port, community, items[:half], results),
+                _snmp_get_batch(host, port, community, items[half:], results),
+            )
+            return
+        # SNMPv1-style error: drop the offending OID and retry the rest
+        bad = int(errorIndex) - 1
+        if 0 <= bad < len(items) and len(items) > 1:
+            results[items[bad][0]] = None
+            await _snmp_get_batch(host, port, community, items[:bad] + items[bad + 1:], results)
+            return
+        for name, _ in items:
+            results[name] = None
+        return
+
+    for (name, _), varBind in zip(items, varBinds):
+        value = varBind[1]
+        if isinstance(value, (NoSuchObject, NoSuchInstance, EndOfMibView)):
+            results[name] = None
+        else:
+            results[name] = snmp_value(value)
+
 async def snmp_get(host, port, community, oids):
-    """Perform SNMP GET for multiple OIDs."""
+    """Perform SNMP GET for multiple OIDs, packed into as few PDUs as possible."""
     results = {}
-    try:
-        engine = SnmpEngine()
-        transport = UdpTransportTarget((host, port), timeout=5, retries=1)
-        for name, oid in oids.items():
-            errorIndication, errorStatus, errorIndex, varBinds = await getCmd(
-                engine,
-                CommunityData(community),
-                transport,
-                ContextData(),
-                ObjectType(ObjectIdentity(oid))
-            )
-            if errorIndication or errorStatus:
-                results[name] = None
-            else:
-                for varBind in varBinds:
-                    results[name] = varBind[1].prettyPrint() if hasattr(varBind[1], 'prettyPrint') else str(varBind[1])
-    except Exception as e:
-        return None, str(e)
+    items = list(oids.items())
+    limit = _snmp_get_limits.get((host, port), SNMP_MAX_GET_OIDS)
+    with poll_timer("snmp", host, "get") as timer:
+        try:
+            await asyncio.gather(*[
+                _snmp_get_batch(host, port, community, items[i:i + limit], results)
+                for i in range(0, len(items), limit)
+            ])
+        except Exception as e:
+            timer["outcome"] = snmp_outcome(e)
+            timer["error"] = str(e)
+            return None, str(e)
     return results, None
 
-async def snmp_bulk_walk(host, port, community, oid_base, max_rows=100):
-    """Perform SNMP bulk walk on a table OID."""
-    results = {}
-    try:
-        engine = SnmpEngine()
-        transport = UdpTransportTarget((host, port), timeout=5, retries=1)
-        count = 0
-        async for errorIndication, errorStatus, errorIndex, varBinds in bulkCmd(
-            engine,
-            CommunityData(community),
-            transport,
-            ContextData(),
-            0, 25,  # nonRepeaters, maxRepetitions
-            ObjectType(ObjectIdentity(oid_base)),
-        ):
-            if errorIndication or errorStatus:
-                break
-            for varBind in varBinds:
-                oid_str = str(varBind[0])
-                if not oid_str.startswith(oid_base):
-                    return results
-                # Extract the index from the OID
-                index = oid_str[len(oid_base) + 1:] if len(oid_str) > len(oid_base) else "0"
-                value = varBind[1]
-                if hasattr(value, 'prettyPrint'):
-                    results[index] = value.prettyPrint()
-                else:
-                    results[index] = str(value)
-            count += 1
-            if count >= max_rows:
-                break
-    except Exception:
-        pass
-    return results
+# Most GETBULK requests sent walking one table, so a misbehaving agent can't
+# keep a walk going forever
+SNMP_MAX_WALK_REQUESTS = 100
+
+async def snmp_walk_table(host, port, community, columns, max_repetitions=25, phase="walk"):
+    """Walk several columns of one table in a single GETBULK stream.
+
+    columns maps a name to a column OID. Returns (rows, truncated): rows
+    aligned by table index, e.g. {"1": {"ifDescr": "eth0", "ifSpeed":
+    "1000000000"}}, and whether the walk stopped at SNMP_MAX_WALK_REQUESTS
+    before reaching the end of the table.
+    """
+    names = list(columns)
+    bases = [columns[name] for name in names]
+    next_oids = list(bases)
+    active = list(range(len(names)))  # Columns not yet walked past their end
+    rows = {}
+    requests = 0
+    with poll_timer("snmp", host, phase) as timer:
+        try:
+            engine = get_snmp_engine()
+            transport = get_snmp_transport(host, port)
+            while active and requests < SNMP_MAX_WALK_REQUESTS:
+                requests += 1
+                errorIndication, errorStatus, errorIndex, varBindTable = await bulkCmd(
+                    engine,
+                    CommunityData(community),
+                    transport,
+                    ContextData(),
+                    0, max_repetitions,  # nonRepeaters, maxRepetitions
+                    *[ObjectType(ObjectIdentity(next_oids[col])) for col in active]
+                )
+                if errorIndication or errorStatus:
+                    timer["outcome"] = snmp_outcome(errorIndication or errorStatus)
+                    timer["error"] = str(errorIndication or errorStatus.prettyPrint())
+                    break
+                if not varBindTable:
+                    break
+
+                still_active = []
+                for pos, col in enumerate(active):
+                    finished = False
+                    for varBinds in varBindTable:
+                        if pos >= len(varBinds):
+                            finished = True
+                            break
+                        oid_str = str(varBinds[pos][0])
+                        # Left the column's subtree, or endOfMibView repeating the last OID
+                        if not oid_str.startswith(bases[col] + ".") or oid_str == next_oids[col]:
+                            finished = True
+                            break
+                        index = oid_str[len(bases[col]) + 1:]
+                        rows.setdefault(index, {})[names[col]] = snmp_value(varBinds[pos][1])
+                        next_oids[col] = oid_str
+                    if not finished:
+                        still_active.append(col)
+                active = still_active
+            if active and requests >= SNMP_MAX_WALK_REQUESTS:
+                timer["outcome"] = "truncated"
+                timer["error"] = f"Stopped after {requests} requests"
+        except Exception as e:
+            timer["outcome"] = snmp_outcome(e)
+            timer["error"] = str(e) or type(e).__name__
+            active = []
+    return rows, bool(active)
+
+async def snmp_bulk_walk(host, port, community, oid_base):
+    """Perform SNMP bulk walk on a single table column."""
+    rows, _ = await snmp_walk_table(host, port, community, {"value": oid_base})
+    return {index: row["value"] for index, row in rows.items()}
+
+# Previous octet counter readings per interface, for computing rates
+_snmp_counter_samples = {}
+
+def counter_delta(previous, current, bits):
+    """Difference between two counter readings, allowing for one wrap.
+
+    Returns None for a 64-bit counter that went backwards: those don't wrap
+    in practice, so the counter was reset.
+    """
+    if current >= previous:
+        return current - previous
+    if bits == 32:
+        return current + 2**32 - previous
+    return None
+
+def interface_rates(key, in_octets, out_octets, bits, uptime_ticks, speed_bps):
+    """Compute in/out bits per second from the previous sample of an interface.
+
+    Elapsed time comes from the agent's sysUpTime, so polling jitter doesn't
+    skew rates; uptime going backwards means the agent restarted and its
+    counters were reset. Falls back to wall time if sysUpTime is missing.
+    """
+    now = time.monotonic()
+    previous = _snmp_counter_samples.get(key)
+    _snmp_counter_samples[key] = {
+        "in": in_octets,
+        "out": out_octets,
+        "bits": bits,
+        "uptime": uptime_ticks,
+        "time": now,
+    }
+    if previous is None or previous["bits"] != bits:
+        return None, None
+
+    if uptime_ticks is not None and previous["uptime"] is not None:
+        if uptime_ticks <= previous["uptime"]:
+            return None, None  # Agent restarted
+        elapsed = (uptime_ticks - previous["uptime"]) / 100
+    else:
+        elapsed = now - previous["time"]
+    if elapsed <= 0:
+        return None, None
+
+    # A 32-bit counter can wrap more than once between polls on a fast link
+    if bits == 32 and speed_bps and speed_bps / 8 * elapsed >= 2**32:
+        return None, None
+
+    rates = []
+    for direction, current in (("in", in_octets), ("out", out_octets)):
+        delta = counter_delta(previous[direction], current, bits)
+        rate = None if delta is None else delta * 8 / elapsed
+        # Faster than the link allows: a counter discontinuity, not a wrap
+        if rate is not None and speed_bps and rate > speed_bps * 1.1:
+            rate = None
+        rates.append(rate)
+    return rates[0], rates[1]
+
+# Static scalars and columns per device: {(host, port): {"fetched",
+# "system", "storage", "interfaces", "ifx", and "uptime" as of the last poll}}
+_snmp_static = {}
+
+async def fetch_snmp_static(host, port, community):
+    """GET the static scalars and walk the static columns of a device."""
+    (system, error), *tables = await asyncio.gather(
+        snmp_get(host, port, community, SNMP_STATIC_OIDS),
+        *[snmp_walk_table(host, port, community,
+                          {name: SNMP_TABLES[name] for name in columns},
+                          max_repetitions=snmp_repetitions(columns), phase=f"walk:{group}:static")
+          for group, columns in SNMP_STATIC_TABLE_GROUPS.items()]
+    )
+    # A failed GET is retried on the next poll rather than cached for the TTL
+    fetched = time.monotonic() if error is None else -math.inf
+    return {"fetched": fetched, "system": system or {},
+            **{group: rows for group, (rows, _) in zip(SNMP_STATIC_TABLE_GROUPS, tables)}}
+
+def snmp_static_stale(static, uptime_ticks, rows):
+    """Whether a device's cached static data must be fetched again.
+
+    rows are this poll's storage and interface rows; a row added or removed
+    (an interface or filesystem coming or going) invalidates the cache, as
+    does a reboot, seen as sysUpTime going backwards.
+    """
+    if time.monotonic() - static["fetched"] >= SNMP_STATIC_TTL:
+        return True
+    if uptime_ticks is not None and static["uptime"] is not None and uptime_ticks < static["uptime"]:
+        return True
+    return any(group_rows and group_rows.keys() != static[group].keys()
+               for group, group_rows in rows.items())
 
 async def fetch_snmp_data(device):
-    """Fetch comprehensive SNMP data from a device."""
+    """Fetch comprehensive SNMP data from a device.
+
+    Each poll walks only the changing columns (load, storage used, interface
+    status and counters); the rest comes from the device's static cache.
+    """
     result = {
         "name": device["name"],
         "host": device["host"],
@@ -679,6 +2149,7 @@ async def fetch_snmp_data(device):
             "power": [],
         },
         "ipmi_error": None,
+        "walk_error": None,
     }
 
     if not SNMP_AVAILABLE:
@@ -696,44 +2167,68 @@ async def fetch_snmp_data(device):
         return result
 
     result["status"] = "up"
-    result["system"]["description"] = sys_data.get("sysDescr", "")
     result["system"]["name"] = sys_data.get("sysName", "")
-    result["system"]["contact"] = sys_data.get("sysContact", "")
-    result["system"]["location"] = sys_data.get("sysLocation", "")
 
     # Parse uptime
     uptime_raw = sys_data.get("sysUpTime", "0")
+    uptime_ticks = None
     try:
         uptime_ticks = int(uptime_raw)
         result["system"]["uptime"] = format_uptime(uptime_ticks)
     except (ValueError, TypeError):
         result["system"]["uptime"] = str(uptime_raw)
 
-    # Fetch CPU load
-    cpu_loads = await snmp_bulk_walk(host, port, community, SNMP_TABLES["hrProcessorLoad"])
-    if cpu_loads:
-        cores = []
-        for idx, load in cpu_loads.items():
-            try:
-                cores.append(int(load))
-            except (ValueError, TypeError):
-                pass
-        if cores:
-            result["cpu"]["cores"] = cores
-            result["cpu"]["count"] = len(cores)
-            result["cpu"]["average"] = round(sum(cores) / len(cores), 1)
-
-    # Fetch storage data
-    storage_descr = await snmp_bulk_walk(host, port, community, SNMP_TABLES["hrStorageDescr"])
-    storage_size = await snmp_bulk_walk(host, port, community, SNMP_TABLES["hrStorageSize"])
-    storage_used = await snmp_bulk_walk(host, port, community, SNMP_TABLES["hrStorageUsed"])
-    storage_units = await snmp_bulk_walk(host, port, community, SNMP_TABLES["hrStorageAllocationUnits"])
-    storage_type = await snmp_bulk_walk(host, port, community, SNMP_TABLES["hrStorageType"])
+    # Walk the dynamic columns of the processor, storage, interface and
+    # ifXTable tables concurrently, with the static ones on a device's first poll
+    key = (host, port)
+    static = _snmp_static.get(key)
+    walks = [
+        snmp_walk_table(host, port, community,
+                        {name: SNMP_TABLES[name] for name in SNMP_TABLE_GROUPS[group]},
+                        max_repetitions=snmp_repetitions(SNMP_TABLE_GROUPS[group]),
+                        phase=f"walk:{group}")
+        for group in ("processor", "storage", "interfaces", "ifx")
+    ]
+    if static is None:
+        walks.append(fetch_snmp_static(host, port, community))
+    walked = await asyncio.gather(*walks)
+    fetched = walked[4:]
+    (cpu_rows, cpu_cut), (storage_rows, storage_cut), (if_rows, if_cut), (ifx_rows, ifx_cut) = walked[:4]
+    truncated = [group for group, cut in (("processor", cpu_cut), ("storage", storage_cut),
+                                          ("interfaces", if_cut), ("ifx", ifx_cut)) if cut]
+    if truncated:
+        result["walk_error"] = (f"Stopped walking {', '.join(truncated)} after {SNMP_MAX_WALK_REQUESTS} "
+                                "requests; later rows are missing")
+    # A truncated walk's rows can't tell whether the table changed
+    complete = {"storage": {} if storage_cut else storage_rows, "interfaces": {} if if_cut else if_rows}
+    if fetched:
+        static = _snmp_static[key] = fetched[0]
+    elif snmp_static_stale(static, uptime_ticks, complete):
+        static = _snmp_static[key] = await fetch_snmp_static(host, port, community)
+    static["uptime"] = uptime_ticks
+
+    result["system"]["description"] = static["system"].get("sysDescr", "")
+    result["system"]["contact"] = static["system"].get("sysContact", "")
+    result["system"]["location"] = static["system"].get("sysLocation", "")
+    storage_rows = {idx: {**static["storage"].get(idx, {}), **row} for idx, row in storage_rows.items()}
+    if_rows = {idx: {**static["interfaces"].get(idx, {}), **row} for idx, row in if_rows.items()}
+
+    # Process CPU load
+    cores = []
+    for idx, row in cpu_rows.items():
+        try:
+            cores.append(int(row.get("hrProcessorLoad")))
+        except (ValueError, TypeError):
+            pass
+    if cores:
+        result["cpu"]["cores"] = cores
+        result["cpu"]["count"] = len(cores)
+        result["cpu"]["average"] = round(sum(cores) / len(cores), 1)
 
     # Process storage entries
-    for idx in storage_descr:
-        descr = storage_descr.get(idx, "")
-        type_oid = storage_type.get(idx, "")
+    for idx, row in storage_rows.items():
+        descr = row.get("hrStorageDescr", "")
+        type_oid = row.get("hrStorageType", "")
 
         # Filter to physical memory and fixed disks
         # hrStorageRam = 1.3.6.1.2.1.25.2.1.2
@@ -742,9 +2237,9 @@ async def fetch_snmp_data(device):
         is_disk = "1.3.6.1.2.1.25.2.1.4" in type_oid
 
         try:
-            size_blocks = int(storage_size.get(idx, 0))
-            used_blocks = int(storage_used.get(idx, 0))
-            alloc_units = int(storage_units.get(idx, 1))
+            size_blocks = int(row.get("hrStorageSize", 0))
+            used_blocks = int(row.get("hrStorageUsed", 0))
+            alloc_units = int(row.get("hrStorageAllocationUnits", 1))
 
             size_bytes = size_blocks * alloc_units
             used_bytes = used_blocks * alloc_units
@@ -766,43 +2261,57 @@ async def fetch_snmp_data(device):
         except (ValueError, TypeError):
             pass
 
-    # Fetch interface data
-    if_descr = await snmp_bulk_walk(host, port, community, SNMP_TABLES["ifDescr"])
-    if_status = await snmp_bulk_walk(host, port, community, SNMP_TABLES["ifOperStatus"])
-    if_speed = await snmp_bulk_walk(host, port, community, SNMP_TABLES["ifSpeed"])
-    if_in = await snmp_bulk_walk(host, port, community, SNMP_TABLES["ifInOctets"])
-    if_out = await snmp_bulk_walk(host, port, community, SNMP_TABLES["ifOutOctets"])
-
-    for idx in if_descr:
-        name = if_descr.get(idx, f"Interface {idx}")
+    # Process interface entries
+    for idx, row in if_rows.items():
+        name = row.get("ifDescr", f"Interface {idx}")
         # Skip loopback and virtual interfaces
         if name.lower() in ("lo", "loopback"):
             continue
 
-        status_val = if_status.get(idx, "2")
+        status_val = row.get("ifOperStatus", "2")
         try:
             status = "up" if int(status_val) == 1 else "down"
         except (ValueError, TypeError):
             status = "unknown"
 
         try:
-            speed = int(if_speed.get(idx, 0))
+            speed = int(row.get("ifSpeed", 0))
         except (ValueError, TypeError):
             speed = 0
 
+        # ifSpeed tops out at ~4.3 Gbps; ifHighSpeed (Mbps) covers faster links
+        ifx = {**static["ifx"].get(idx, {}), **ifx_rows.get(idx, {})}
         try:
-            in_octets = int(if_in.get(idx, 0))
+            high_speed = int(ifx.get("ifHighSpeed", 0))
         except (ValueError, TypeError):
-            in_octets = 0
+            high_speed = 0
+        if high_speed:
+            speed = high_speed * 1000000
 
+        # Prefer the 64-bit counters; 32-bit ones wrap in seconds on 10G links
         try:
-            out_octets = int(if_out.get(idx, 0))
-        except (ValueError, TypeError):
-            out_octets = 0
+            in_octets = int(ifx["ifHCInOctets"])
+            out_octets = int(ifx["ifHCOutOctets"])
+            counter_bits = 64
+        except (KeyError, ValueError, TypeError):
+            counter_bits = 32
+            try:
+                in_octets = int(row.get("ifInOctets", 0))
+            except (ValueError, TypeError):
+                in_octets = 0
+
+            try:
+                out_octets = int(row.get("ifOutOctets", 0))
+            except (ValueError, TypeError):
+                out_octets = 0
+
+        in_bps, out_bps = interface_rates((host, port, idx), in_octets, out_octets,
+                                          counter_bits, uptime_ticks, speed)
 
         # Only include interfaces with traffic or that are up
         if status == "up" or in_octets > 0 or out_octets > 0:
             result["interfaces"].append({
+                "index": idx,
                 "name": name,
                 "status": status,
                 "speed": format_speed(speed),
@@ -810,6 +2319,13 @@ async def fetch_snmp_data(device):
                 "out_octets": out_octets,
                 "in_formatted": format_octets(in_octets),
                 "out_formatted": format_octets(out_octets),
+                "counter_bits": counter_bits,
+                "in_bps": in_bps,
+                "out_bps": out_bps,
+                "in_rate": format_bps(in_bps),
+                "out_rate": format_bps(out_bps),
+                "in_util": round(in_bps / speed * 100, 1) if in_bps is not None and speed else None,
+                "out_util": round(out_bps / speed * 100, 1) if out_bps is not None and speed else None,
             })
 
     # Fetch IPMI sensors if credentials are provided
@@ -830,79 +2346,2011 @@ async def get_all_snmp_data():
     if not SNMP_DEVICES:
         return []
 
-    tasks = [fetch_snmp_data(device) for device in SNMP_DEVICES]
+    tasks = [limited_poll("snmp", device["host"], fetch_snmp_data, device) for device in SNMP_DEVICES]
     results = await asyncio.gather(*tasks)
     return results
 
+# =============================================================================
+# METRIC HISTORY
+# =============================================================================
+
+# Slot layout: key and last update, one (position, count) header per tier,
+# then each tier's ring of (timestamp, average, min, max) records.
+HISTORY_MAGIC = b"SMHIST1\0"
+HISTORY_KEY_BYTES = 192
+HISTORY_FILE_HEADER = struct.Struct("<8sqq32s")  # magic, slot size, slots, tier layout
+HISTORY_SLOT_HEADER = struct.Struct(f"<{HISTORY_KEY_BYTES}sd")
+HISTORY_TIER_HEADER = struct.Struct("<qq")
+HISTORY_RECORD_FIELDS = 4
+
+_history = {
+    "ready": False,
+    "series": OrderedDict(),  # Least recently updated first
+    "free": [],
+    "mmap": None,
+    "evicted": 0,
+    "dropped": 0,  # Samples for new series refused while the store was full
+}
+
+def _history_layout():
+    """Get the slot size and the offset of each tier's records in a slot."""
+    offset = HISTORY_SLOT_HEADER.size + HISTORY_TIER_HEADER.size * len(HISTORY["tiers"])
+    offsets = []
+    for step, capacity in HISTORY["tiers"]:
+        offsets.append(offset)
+        offset += capacity * HISTORY_RECORD_FIELDS * 8
+    return offset, offsets
+
+def _history_key(key):
+    """Normalize a series key to what fits in a slot."""
+    encoded = key.encode()
+    if len(encoded) <= HISTORY_KEY_BYTES:
+        return key
+    digest = hashlib.sha1(encoded).hexdigest()
+    return encoded[:HISTORY_KEY_BYTES - 41].decode(errors="ignore") + "#" + digest
+
+def _history_attach(key, slot, view, updated):
+    """Build the in-memory handle for a series stored in a slot."""
+    slot_size, offsets = _history_layout()
+    return {
+        "key": key,
+        "slot": slot,
+        "view": view,
+        "data": [view[offset:offset + capacity * HISTORY_RECORD_FIELDS * 8].cast("d")
+                 for offset, (step, capacity) in zip(offsets, HISTORY["tiers"])],
+        "pending": [None] * len(HISTORY["tiers"]),
+        "updated": updated,
+    }
+
+def open_history(backed=True):
+    """Set up the history store, loading series from the backing file if configured.
+
+    With backed false the store is kept in memory even if a path is set.
+    """
+    if _history["ready"]:
+        return
+    slot_size, offsets = _history_layout()
+    slots = max(1, HISTORY["max_bytes"] // slot_size)
+    _history.update(ready=True, slots=slots, slot_size=slot_size)
+    if not HISTORY["path"] or not backed:
+        return
+
+    layout = hashlib.sha256(repr(HISTORY["tiers"]).encode()).digest()
+    size = HISTORY_FILE_HEADER.size + slots * slot_size
+    fd = os.open(HISTORY["path"], os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        header = os.pread(fd, HISTORY_FILE_HEADER.size, 0)
+        valid = (len(header) == HISTORY_FILE_HEADER.size and
+                 HISTORY_FILE_HEADER.unpack(header) == (HISTORY_MAGIC, slot_size, slots, layout))
+        if not valid:
+            os.ftruncate(fd, 0)  # Layout changed, start over
+        os.ftruncate(fd, size)
+        mm = mmap.mmap(fd, size)
+    finally:
+        os.close(fd)
+    if not valid:
+        HISTORY_FILE_HEADER.pack_into(mm, 0, HISTORY_MAGIC, slot_size, slots, layout)
+    _history["mmap"] = mm
+
+    view = memoryview(mm)
+    loaded = []
+    for slot in reversed(range(slots)):
+        base = HISTORY_FILE_HEADER.size + slot * slot_size
+        raw_key, updated = HISTORY_SLOT_HEADER.unpack_from(mm, base)
+        key = raw_key.rstrip(b"\0").decode(errors="ignore")
+        if key:
+            loaded.append(_history_attach(key, slot, view[base:base + slot_size], updated))
+        else:
+            _history["free"].append(slot)
+    for series in sorted(loaded, key=lambda series: series["updated"]):
+        _history["series"][series["key"]] = series
+
+def close_history():
+    """Flush and release the backing file."""
+    mm = _history["mmap"]
+    _history.update(ready=False, series=OrderedDict(), free=[], mmap=None)
+    if mm is not None:
+        mm.flush()
+        try:
+            mm.close()
+        except BufferError:
+            pass  # A caller still holds a view; it is released with it
+
+def _history_series(key):
+    """Get the series for a key, allocating a slot (and evicting if full).
+
+    Returns None if the store is full of series still being updated.
+    """
+    open_history()
+    series = _history["series"].get(key)
+    if series is not None:
+        return series
+
+    slot_size = _history["slot_size"]
+    mm = _history["mmap"]
+    if mm is None:
+        slot = None
+        if len(_history["series"]) >= _history["slots"] and not _history_evict():
+            return None
+        view = memoryview(bytearray(slot_size))
+    else:
+        if not _history["free"] and not _history_evict():
+            return None
+        slot = _history["free"].pop()
+        base = HISTORY_FILE_HEADER.size + slot * slot_size
+        view = memoryview(mm)[base:base + slot_size]
+        view[:] = bytes(slot_size)
+
+    HISTORY_SLOT_HEADER.pack_into(view, 0, key.encode(), 0.0)
+    series = _history_attach(key, slot, view, 0.0)
+    _history["series"][key] = series
+    return series
+
+def _history_evict():
+    """Drop the least recently updated series to make room, if it has gone idle.
+
+    Returns False, leaving the store untouched, if every series is live;
+    evicting one then would only have it evict another on its next sample.
+    """
+    oldest = next(iter(_history["series"].values()))
+    idle_after = HISTORY["evict_idle_intervals"] * max(COLLECTOR_INTERVALS.values())
+    if time.time() - oldest["updated"] < idle_after:
+        _history["dropped"] += 1
+        return False
+    _history["series"].popitem(last=False)
+    HISTORY_SLOT_HEADER.pack_into(oldest["view"], 0, b"", 0.0)
+    if oldest["slot"] is not None:
+        _history["free"].append(oldest["slot"])
+    _history["evicted"] += 1
+    return True
+
+def _history_append(series, tier, record):
+    """Append a record to one tier's ring buffer."""
+    capacity = HISTORY["tiers"][tier][1]
+    header_offset = HISTORY_SLOT_HEADER.size + tier * HISTORY_TIER_HEADER.size
+    pos, count = HISTORY_TIER_HEADER.unpack_from(series["view"], header_offset)
+    data = series["data"][tier]
+    for i, value in enumerate(record):
+        data[pos * HISTORY_RECORD_FIELDS + i] = value
+    HISTORY_TIER_HEADER.pack_into(series["view"], header_offset,
+                                  (pos + 1) % capacity, min(count + 1, capacity))
+
+def record_metric(key, value, ts=None):
+    """Record one sample, rolling completed buckets into the aggregate tiers."""
+    if value is None:
+        return
+    try:
+        value = float(value)
+    except (ValueError, TypeError):
+        return
+    ts = time.time() if ts is None else ts
+    series = _history_series(_history_key(key))
+    if series is None:
+        return
+
+    for tier, (step, capacity) in enumerate(HISTORY["tiers"]):
+        if step == 0:
+            _history_append(series, tier, (ts, value, value, value))
+            continue
+        bucket = ts - ts % step
+        pending = series["pending"][tier]
+        if pending is not None and pending[0] != bucket:
+            start, total, count, low, high = pending
+            _history_append(series, tier, (start, total / count, low, high))
+            pending = None
+        if pending is None:
+            series["pending"][tier] = [bucket, value, 1, value, value]
+        else:
+            pending[1] += value
+            pending[2] += 1
+            pending[3] = min(pending[3], value)
+            pending[4] = max(pending[4], value)
+
+    series["updated"] = ts
+    _history["series"].move_to_end(series["key"])
+    HISTORY_SLOT_HEADER.pack_into(series["view"], 0, series["key"].encode(), ts)
+
+def get_history(key, step=0, since=None):
+    """Get (timestamp, average, min, max) records for a series at one tier."""
+    open_history()
+    series = _history["series"].get(_history_key(key))
+    tiers = [tier_step for tier_step, capacity in HISTORY["tiers"]]
+    if series is None or step not in tiers:
+        return []
+    tier = tiers.index(step)
+    capacity = HISTORY["tiers"][tier][1]
+    header_offset = HISTORY_SLOT_HEADER.size + tier * HISTORY_TIER_HEADER.size
+    pos, count = HISTORY_TIER_HEADER.unpack_from(series["view"], header_offset)
+    data = series["data"][tier]
+
+    records = []
+    for i in range(count):
+        index = (pos - count + i) % capacity * HISTORY_RECORD_FIELDS
+        record = tuple(data[index:index + HISTORY_RECORD_FIELDS].tolist())
+        if since is None or record[0] > since:
+            records.append(record)
+    return records
+
+def get_history_stats():
+    """Summarize the history store."""
+    open_history()
+    return {
+        "series": len(_history["series"]),
+        "max_series": _history["slots"],
+        "slot_bytes": _history["slot_size"],
+        "bytes": len(_history["series"]) * _history["slot_size"],
+        "max_bytes": HISTORY["max_bytes"],
+        "evicted": _history["evicted"],
+        "dropped": _history["dropped"],
+        "backed_by": HISTORY["path"],
+        "tiers": HISTORY["tiers"],
+    }
+
+def _record_sensor_history(prefix, sensor_categories, ts):
+    for category, sensors in sensor_categories.items():
+        for sensor in sensors:
+            record_metric(f"{prefix}:{category}:{sensor['id']}:{sensor['name']}", sensor["value"], ts)
+
+def record_snapshot_history(section, data, ts, targets=None):
+    """Record the numeric metrics in a freshly collected snapshot.
+
+    targets limits recording to the services or devices that were just
+    polled, so unchanged targets aren't recorded again.
+    """
+    if section == "services":
+        for name, status in data.items():
+            if targets is None or name in targets:
+                record_metric(f"service:{name}:response_time", status.get("response_time"), ts)
+    elif section == "proxmox":
+        for node in data["nodes"]:
+            if targets is None or node["cluster"] in targets:
+                record_metric(f"proxmox:{node['cluster']}:node:{node['name']}:cpu", node["cpu_percent"], ts)
+                record_metric(f"proxmox:{node['cluster']}:node:{node['name']}:mem", node["mem_percent"], ts)
+        for vm in data["vms"] + data["containers"]:
+            if vm["status"] == "up" and (targets is None or vm["cluster"] in targets):
+                record_metric(f"proxmox:{vm['cluster']}:vm:{vm['vmid']}:cpu", vm["cpu_percent"], ts)
+                record_metric(f"proxmox:{vm['cluster']}:vm:{vm['vmid']}:mem", vm["mem_percent"], ts)
+    elif section == "bmc":
+        for device in data:
+            if not device["error"] and (targets is None or device["name"] in targets):
+                _record_sensor_history(f"redfish:{device['name']}", device["sensor_categories"], ts)
+    elif section == "snmp":
+        for device in data:
+            if device["error"] or (targets is not None and device["name"] not in targets):
+                continue
+            record_metric(f"snmp:{device['name']}:cpu", device["cpu"]["average"], ts)
+            record_metric(f"snmp:{device['name']}:memory", device["memory"]["percent"], ts)
+            for disk in device["disks"]:
+                record_metric(f"snmp:{device['name']}:disk:{disk['mount']}", disk["percent"], ts)
+            for iface in device["interfaces"]:
+                record_metric(f"snmp:{device['name']}:if:{iface['index']}:{iface['name']}:in_bps",
+                              iface["in_bps"], ts)
+                record_metric(f"snmp:{device['name']}:if:{iface['index']}:{iface['name']}:out_bps",
+                              iface["out_bps"], ts)
+            _record_sensor_history(f"ipmi:{device['name']}", device["sensor_categories"], ts)
+
+# =============================================================================
+# BACKGROUND COLLECTOR
+# =============================================================================
+
+# A published result for one section. Snapshots are replaced wholesale on
+# every poll and never mutated afterwards, so routes can render them without
+# locking while the next poll is in flight.
+#
+# Versions restart at 1 with the process, so each run of versions carries
+# an epoch: clients holding a version (or ETag) from another epoch get the
+# full snapshot. In multi-worker mode a new leader carries on the previous
+# leader's versions and keeps its epoch.
+Snapshot = namedtuple("Snapshot", ["data", "updated", "version", "error", "epoch"])
+SNAPSHOT_EPOCH = os.urandom(6).hex()
+
+SNAPSHOTS = {}
+_snapshot_events = {}
+_collector_tasks = []
+
+# Per-target change tracking for delta API responses: the snapshot version
+# in which each target last changed, and when removed targets disappeared.
+_target_versions = {}
+_removed_targets = {}
+
+async def collect_services():
+    """Poll all services and return a copy of the status table."""
+    await check_services_async()
+    return dict(STATUS)
+
+async def collect_proxmox():
+    """Poll every Proxmox cluster and return the merged view."""
+    return merge_proxmox_clusters(await get_proxmox_data())
+
+async def collect_bmc():
+    """Poll all BMC devices."""
+    return await get_all_bmc_data()
+
+async def collect_snmp():
+    """Poll all SNMP devices."""
+    return await get_all_snmp_data()
+
+COLLECTORS = {
+    "services": collect_services,
+    "proxmox": collect_proxmox,
+    "bmc": collect_bmc,
+    "snmp": collect_snmp,
+}
+
+def snapshot_targets(section, data):
+    """Split a section's snapshot data into {target id: target data}."""
+    if not data:
+        return {}
+    if section == "services":
+        return {
+            name: service_target(name, category, url, data)
+            for category, services in SERVICES.items()
+            for name, url in services.items()
+        }
+    if section == "proxmox":
+        targets = {f"node:{node['cluster']}/{node['name']}": node for node in data["nodes"]}
+        for vm in data["vms"] + data["containers"]:
+            targets[f"{vm['type']}:{vm['cluster']}/{vm['vmid']}"] = vm
+        return targets
+    return {device["name"]: device for device in data}
+
+def service_target(name, category, url, data):
+    return {"name": name, "category": category, "url": url, **data.get(name, {})}
+
+def track_target_changes(section, version, data):
+    """Record which targets changed in a new snapshot version."""
+    versions = _target_versions.setdefault(section, {})
+    removed = _removed_targets.setdefault(section, {})
+    targets = snapshot_targets(section, data)
+    for target_id, target in targets.items():
+        digest = hashlib.sha1(json.dumps(target, sort_keys=True, default=str).encode()).hexdigest()
+        previous = versions.get(target_id)
+        if previous is None or previous[1] != digest:
+            versions[target_id] = (version, digest)
+            removed.pop(target_id, None)
+    changed = [target_id for target_id, (target_version, digest) in versions.items()
+               if target_version == version]
+    gone = [target_id for target_id in versions if target_id not in targets]
+    for target_id in gone:
+        del versions[target_id]
+        removed[target_id] = version
+    return changed, gone
+
+def changed_targets(section, since):
+    """Get ids of targets changed and removed after a snapshot version."""
+    changed = [target_id for target_id, (version, digest) in _target_versions.get(section, {}).items()
+               if version > since]
+    removed = [target_id for target_id, version in _removed_targets.get(section, {}).items()
+               if version > since]
+    return changed, removed
+
+def _snapshot_event(section):
+    """Get the event that is set once a section has its first snapshot."""
+    if section not in _snapshot_events:
+        _snapshot_events[section] = asyncio.Event()
+    return _snapshot_events[section]
+
+def publish_snapshot(section, data, error=None, polled=None):
+    """Publish a new snapshot for a section, keeping the last good data on error.
+
+    polled names the targets refreshed since the last snapshot, if not all.
+    """
+    previous = SNAPSHOTS.get(section)
+    if error is not None and previous is not None:
+        data = previous.data
+    elif error is None and section in SITE_SECTIONS:
+        _local_data[section] = data
+        if _sites:
+            data = merge_site_results(section, data)
+    version = previous.version + 1 if previous else 1
+    epoch = previous.epoch if previous else SNAPSHOT_EPOCH
+    snapshot = Snapshot(data=data, updated=time.time(), version=version, error=error, epoch=epoch)
+    apply_snapshot(section, snapshot, polled)
+    if _shared["leader"]:
+        write_shared_snapshot(section, snapshot, polled)
+
+def apply_snapshot(section, snapshot, polled=None):
+    """Make a snapshot current: notify subscribers and record its history."""
+    SNAPSHOTS[section] = snapshot
+    changed, removed = track_target_changes(section, snapshot.version, snapshot.data)
+    if section == "services":
+        update_status_index(snapshot.data, changed + removed)
+    _snapshot_event(section).set()
+    if changed or removed:
+        notify_subscribers(section, snapshot.version, changed, removed)
+    if snapshot.error is None:
+        record_snapshot_history(section, snapshot.data, snapshot.updated, polled)
+
+# =============================================================================
+# EVENT STREAM
+# =============================================================================
+
+_event_subscribers = []
+
+def new_subscriber(sections):
+    """Create the state for one connected event stream client.
+
+    Pending changes are kept per section rather than queued per update, so
+    rapid updates coalesce and the backlog is bounded by construction.
+    """
+    return {
+        "sections": sections,
+        "pending": {},
+        "wake": asyncio.Event(),
+    }
+
+def push_event(subscriber, section, version, changed, removed):
+    """Merge a change into a subscriber's pending events."""
+    entry = subscriber["pending"].setdefault(section, {"changed": set(), "removed": set(), "resync": False})
+    entry["version"] = version
+    # The latest of a removal and a re-add wins
+    entry["removed"].difference_update(changed)
+    entry["changed"].update(changed)
+    entry["changed"].difference_update(removed)
+    entry["removed"].update(removed)
+    if len(entry["changed"]) + len(entry["removed"]) > EVENT_STREAM["max_pending_targets"]:
+        entry.update(changed=set(), removed=set(), resync=True)
+    subscriber["wake"].set()
+
+def drain_events(subscriber):
+    """Take all pending events from a subscriber."""
+    pending, subscriber["pending"] = subscriber["pending"], {}
+    subscriber["wake"].clear()
+    return pending
+
+def notify_subscribers(section, version, changed, removed):
+    """Queue a change for every client watching a section."""
+    for subscriber in _event_subscribers:
+        if section in subscriber["sections"]:
+            push_event(subscriber, section, version, changed, removed)
+
+def format_event(event, data):
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+async def event_stream(subscriber):
+    """Yield change events for a subscriber, with heartbeats while idle."""
+    _event_subscribers.append(subscriber)
+    try:
+        yield b"retry: 5000\n\n"
+        while True:
+            try:
+                await asyncio.wait_for(subscriber["wake"].wait(), EVENT_STREAM["heartbeat"])
+            except asyncio.TimeoutError:
+                yield b": heartbeat\n\n"
+                continue
+            await asyncio.sleep(EVENT_STREAM["coalesce"])
+            for section, entry in drain_events(subscriber).items():
+                yield format_event("change", {
+                    "section": section,
+                    "epoch": SNAPSHOTS[section].epoch,
+                    "version": entry["version"],
+                    "targets": sorted(entry["changed"]),
+                    "removed": sorted(entry["removed"]),
+                    "resync": entry["resync"],
+                })
+    finally:
+        _event_subscribers.remove(subscriber)
+
+# =============================================================================
+# STATUS INDEX
+# =============================================================================
+
+# Service statuses, worst first; pending means not polled yet
+SERVICE_STATUSES = ("down", "warning", "up", "pending")
+
+# Service counts per category and status, and the services in each status.
+# Updated from the targets that changed in each snapshot, not rescanned.
+_status_index = {
+    "services": None,  # The SERVICES dict the index was built from
+    "categories": {},  # name -> category
+    "positions": {},   # name -> position in SERVICES, the default order
+    "status": {},      # name -> status
+    "counts": {},      # category -> {status: count}
+    "members": {},     # status -> set of names
+}
+
+def _rebuild_status_index():
+    """Index SERVICES with every service pending. Returns whether it was stale."""
+    index = _status_index
+    if index["services"] is SERVICES:
+        return False
+    index.update(services=SERVICES, categories={}, positions={}, status={}, counts={},
+                 members={status: set() for status in SERVICE_STATUSES})
+    for category, services in SERVICES.items():
+        index["counts"][category] = dict.fromkeys(SERVICE_STATUSES, 0)
+        for name in services:
+            index["categories"][name] = category
+            index["positions"][name] = len(index["positions"])
+            index["status"][name] = "pending"
+            index["counts"][category]["pending"] += 1
+            index["members"]["pending"].add(name)
+    return True
+
+def update_status_index(data, names):
+    """Move the named services to their status in new snapshot data."""
+    index = _status_index
+    if _rebuild_status_index():
+        names = index["status"]
+    data = data or {}
+    for name in names:
+        category = index["categories"].get(name)
+        if category is None:
+            continue
+        status = data.get(name, {}).get("status", "pending")
+        previous = index["status"][name]
+        if status != previous:
+            index["status"][name] = status
+            index["counts"][category][previous] -= 1
+            index["counts"][category][status] += 1
+            index["members"][previous].discard(name)
+            index["members"][status].add(name)
+
+def services_summary():
+    """Service counts by status, overall and per category."""
+    _rebuild_status_index()
+    counts = _status_index["counts"]
+    return {
+        "total": len(_status_index["status"]),
+        "statuses": {status: len(_status_index["members"][status]) for status in SERVICE_STATUSES},
+        "categories": {category: dict(category_counts) for category, category_counts in counts.items()},
+    }
+
+def query_services(data, statuses=None, categories=None, search=None, sort=None):
+    """Names of the services matching a filter, in order.
+
+    statuses and categories are collections to match; search is a
+    case-insensitive substring of the name or URL. sort is "name",
+    "status" (worst first), "response_time" (slowest first) or None for
+    configuration order.
+    """
+    _rebuild_status_index()
+    index = _status_index
+    if statuses:
+        names = set().union(*(index["members"].get(status, ()) for status in statuses))
+    else:
+        names = index["status"].keys()
+    if categories:
+        names = [name for name in names if index["categories"][name] in categories]
+    if search:
+        search = search.lower()
+        names = [name for name in names
+                 if search in name.lower() or search in SERVICES[index["categories"][name]][name].lower()]
+
+    positions = index["positions"]
+    if sort == "name":
+        return sorted(names, key=lambda name: (name.lower(), positions[name]))
+    if sort == "status":
+        return sorted(names, key=lambda name: (SERVICE_STATUSES.index(index["status"][name]), positions[name]))
+    if sort == "response_time":
+        def slowest(name):
+            response_time = (data or {}).get(name, {}).get("response_time")
+            return (response_time is None, -(response_time or 0), positions[name])
+        return sorted(names, key=slowest)
+    return sorted(names, key=positions.__getitem__)
+
+def service_query_args(args):
+    """Read filter, sort and page query parameters.
+
+    Multiple statuses or categories are comma-separated.
+    """
+    def split(value):
+        return {item for item in value.split(",") if item} if value else None
+    sort = args.get("sort")
+    return {
+        "statuses": split(args.get("status")),
+        "categories": split(args.get("category")),
+        "search": args.get("q", "").strip() or None,
+        "sort": sort if sort in ("name", "status", "response_time") else None,
+        "page": max(1, args.get("page", 1, type=int)),
+        "per_page": max(1, args.get("per_page", DASHBOARD_PAGE_SIZE, type=int)),
+    }
+
+def paginate(items, page, per_page):
+    """Slice one page out of items. Returns (page items, page, page count)."""
+    pages = max(1, math.ceil(len(items) / per_page))
+    page = min(page, pages)
+    return items[(page - 1) * per_page:page * per_page], page, pages
+
+# =============================================================================
+# POLL SCHEDULER
+# =============================================================================
+
+# Per-section scheduler state: {target id: state}
+_schedules = {}
+
+async def poll_service(name, url):
+    await limited_poll("services", urlsplit(url).netloc, fetch_status, get_http_session("services"), name, url)
+    status = STATUS[name]
+    return status, "down" if status["status"] == "down" else None
+
+async def poll_proxmox(cluster):
+    result = await limited_poll("proxmox", urlsplit(cluster["host"]).netloc, fetch_proxmox_cluster, cluster)
+    return result, result["error"]
+
+async def poll_bmc(device):
+    result = await limited_poll("bmc", device["host"], fetch_bmc_status, device)
+    return result, result["error"]
+
+async def poll_snmp(device):
+    result = await limited_poll("snmp", device["host"], fetch_snmp_data, device)
+    return result, result["error"]
+
+def poll_targets(section):
+    """Get {target id: (interval, poll)} for a section.
+
+    Each poll is a coroutine function returning (result, error).
+    """
+    interval = COLLECTOR_INTERVALS.get(section, 30)
+    if section == "services":
+        # An agent may check only some services from its site
+        wanted = AGENT["services"] if AGENT["central"] else None
+        return {name: (interval, lambda name=name, url=url: poll_service(name, url))
+                for services in SERVICES.values() for name, url in services.items()
+                if wanted is None or name in wanted}
+    if section == "proxmox":
+        return {cluster["name"]: (interval, lambda cluster=cluster: poll_proxmox(cluster))
+                for cluster in get_proxmox_clusters()}
+    devices, poll = (BMC_DEVICES, poll_bmc) if section == "bmc" else (SNMP_DEVICES, poll_snmp)
+    return {device["name"]: (device.get("interval", interval), lambda device=device: poll(device))
+            for device in devices}
+
+def assemble_section(section, results):
+    """Build a section's snapshot data from the latest result per target."""
+    if section == "services":
+        return dict(results)
+    if section == "proxmox":
+        return merge_proxmox_clusters([results[cluster["name"]] for cluster in get_proxmox_clusters()
+                                       if cluster["name"] in results])
+    devices = BMC_DEVICES if section == "bmc" else SNMP_DEVICES
+    return [results[device["name"]] for device in devices if device["name"] in results]
+
+def sync_schedule(section, targets, results):
+    """Add newly configured targets (due now) and forget removed ones."""
+    schedule = _schedules.setdefault(section, {})
+    for target_id, (interval, _) in targets.items():
+        if target_id not in schedule:
+            schedule[target_id] = {
+                "interval": interval,
+                "next_due": time.monotonic(),
+                "failures": 0,
+                "polls": 0,
+                "last_poll": None,
+                "last_duration": None,
+                "last_error": None,
+            }
+        schedule[target_id]["interval"] = interval
+    for target_id in [target_id for target_id in schedule if target_id not in targets]:
+        del schedule[target_id]
+        results.pop(target_id, None)
+    return schedule
+
+def reschedule(state, error, now):
+    """Set a target's next poll time from its latest outcome."""
+    interval = state["interval"]
+    if error is not None:
+        state["failures"] += 1
+        delay = min(interval * 2 ** (state["failures"] - 1), max(interval, SCHEDULER["max_backoff"]))
+    elif state["failures"]:
+        state["failures"] = 0
+        delay = min(interval, SCHEDULER["recovery_probe"])
+    else:
+        delay = interval
+    state["last_error"] = error
+    state["next_due"] = now + delay * random.uniform(1 - SCHEDULER["jitter"], 1 + SCHEDULER["jitter"])
+
+async def _staggered_poll(poll, offset, run):
+    await asyncio.sleep(offset)
+    _poll_run.set(run)
+    began = time.monotonic()
+    try:
+        return await poll()
+    finally:
+        # Timed from when the poll got its slot, so queueing isn't counted
+        run["duration"] = time.monotonic() - run.get("started", began)
+
+async def run_poll_cycle(section, schedule, targets, due, results):
+    """Poll the due targets, staggered and bounded by the cycle deadline.
+
+    Targets still queued for a poll slot at the deadline weren't polled, so
+    they are due again at once rather than charged a failure.
+    """
+    step = SCHEDULER["stagger"] / len(due)
+    runs = {target_id: {} for target_id in due}
+    tasks = {asyncio.create_task(_staggered_poll(targets[target_id][1], i * step, runs[target_id])): target_id
+             for i, target_id in enumerate(due)}
+    done, pending = await asyncio.wait(tasks, timeout=SCHEDULER["deadline"])
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    now = time.monotonic()
+    for task, target_id in tasks.items():
+        state = schedule[target_id]
+        if task in pending and "started" not in runs[target_id]:
+            state["next_due"] = now
+            continue
+        if task in pending:
+            error = f"Poll cycle deadline of {SCHEDULER['deadline']}s exceeded"
+        elif task.exception() is not None:
+            error = str(task.exception()) or type(task.exception()).__name__
+        else:
+            results[target_id], error = task.result()
+        state["polls"] += 1
+        state["last_poll"] = time.time()
+        state["last_duration"] = round(runs[target_id]["duration"], 3)
+        reschedule(state, error, now)
+
+def get_schedule_state():
+    """Scheduler state per section and target, soonest due first."""
+    now = time.monotonic()
+    state = {}
+    for section, schedule in _schedules.items():
+        rows = [{
+            "target": target_id,
+            "interval": target["interval"],
+            "next_due_in": round(target["next_due"] - now, 1),
+            "failures": target["failures"],
+            "polls": target["polls"],
+            "last_poll": target["last_poll"],
+            "last_duration": target["last_duration"],
+            "last_error": target["last_error"],
+        } for target_id, target in schedule.items()]
+        rows.sort(key=lambda row: row["next_due_in"])
+        state[section] = rows
+    return state
+
+async def collector_loop(section):
+    """Poll each target of a section whenever it falls due."""
+    results = {}
+    first = True
+    while True:
+        try:
+            targets = poll_targets(section)
+            schedule = sync_schedule(section, targets, results)
+            now = time.monotonic()
+            # Targets falling due within the next second join this cycle
+            due = [target_id for target_id, state in schedule.items() if state["next_due"] <= now + 1]
+            if due:
+                await run_poll_cycle(section, schedule, targets, due, results)
+            if due or first:
+                publish_snapshot(section, assemble_section(section, results), polled=set(due))
+                first = False
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            app.logger.exception("Error collecting %s: %s", section, e)
+            publish_snapshot(section, None, error=str(e))
+            first = False
+            await asyncio.sleep(COLLECTOR_INTERVALS.get(section, 30))
+            continue
+        next_due = min((state["next_due"] for state in schedule.values()),
+                       default=time.monotonic() + COLLECTOR_INTERVALS.get(section, 30))
+        await asyncio.sleep(max(0.1, next_due - time.monotonic()))
+
+# =============================================================================
+# MULTI-WORKER MODE
+# =============================================================================
+
+# Each section's file holds a header and two buffers. The leader writes a new
+# snapshot into the buffer not in use, then bumps the generation, whose
+# parity selects the current buffer. A reader that sees the same generation
+# before and after parsing knows the buffer wasn't rewritten meanwhile.
+SHARED_MAGIC = b"SRVSNAP1"
+SHARED_HEADER = struct.Struct("<8sQQQ")  # magic, generation, length of each buffer
+SHARED_HEADER_SIZE = 64
+
+_shared = {
+    "leader": False,
+    "lock": None,      # fd holding the leader lock
+    "files": {},       # section -> mmap
+    "generations": {}, # section -> last generation loaded or written
+}
+
+def check_shared_owner(fd, path):
+    """Refuse a shared file or directory another user could have planted."""
+    if os.fstat(fd).st_uid != os.getuid():
+        os.close(fd)
+        raise PermissionError(f"{path} is not owned by uid {os.getuid()}")
+
+def prepare_shared_path():
+    """Create the snapshot directory, private to this user."""
+    path = SHARED_SNAPSHOTS["path"]
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    check_shared_owner(fd, path)
+    os.close(fd)
+
+def try_become_leader():
+    """Take the collector lock if no other worker holds it."""
+    path = os.path.join(SHARED_SNAPSHOTS["path"], "leader.lock")
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+    check_shared_owner(fd, path)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    os.ftruncate(fd, 0)
+    os.write(fd, f"{os.getpid()}\n".encode())
+    _shared["lock"] = fd
+    return True
+
+def _shared_file(section, create=False):
+    """Map a section's snapshot file, or None if it doesn't exist yet."""
+    mm = _shared["files"].get(section)
+    if mm is not None:
+        return mm
+    path = os.path.join(SHARED_SNAPSHOTS["path"], f"{section}.snap")
+    size = SHARED_HEADER_SIZE + 2 * SHARED_SNAPSHOTS["max_bytes"]
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_NOFOLLOW | (os.O_CREAT if create else 0), 0o600)
+    except FileNotFoundError:
+        return None
+    check_shared_owner(fd, path)
+    try:
+        if create and os.fstat(fd).st_size != size:
+            # Sparse, so unused buffer space costs nothing
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, size)
+            os.pwrite(fd, SHARED_HEADER.pack(SHARED_MAGIC, 0, 0, 0), 0)
+        if os.fstat(fd).st_size <= SHARED_HEADER_SIZE:
+            return None
+        mm = mmap.mmap(fd, 0)
+    finally:
+        os.close(fd)
+    _shared["files"][section] = mm
+    return mm
+
+def write_shared_snapshot(section, snapshot, polled):
+    """Publish a snapshot to the other workers."""
+    payload = json.dumps({
+        "snapshot": snapshot._asdict(),
+        "polled": sorted(polled) if polled is not None else None,
+    }, separators=(",", ":")).encode()
+    if len(payload) > SHARED_SNAPSHOTS["max_bytes"]:
+        app.logger.warning("Snapshot for %s is %d bytes, over the shared max_bytes; not shared",
+                           section, len(payload))
+        return
+    mm = _shared_file(section, create=True)
+    magic, generation, *lengths = SHARED_HEADER.unpack_from(mm, 0)
+    buffer = (generation + 1) % 2
+    offset = SHARED_HEADER_SIZE + buffer * SHARED_SNAPSHOTS["max_bytes"]
+    mm[offset:offset + len(payload)] = payload
+    lengths[buffer] = len(payload)
+    SHARED_HEADER.pack_into(mm, 0, SHARED_MAGIC, generation, *lengths)
+    struct.pack_into("<Q", mm, 8, generation + 1)
+    _shared["generations"][section] = generation + 1
+
+def read_shared_snapshot(section):
+    """Get the {"snapshot", "polled"} record the leader last wrote, or None if unchanged."""
+    mm = _shared_file(section)
+    if mm is None:
+        return None
+    capacity = (len(mm) - SHARED_HEADER_SIZE) // 2
+    for _ in range(3):
+        magic, generation, *lengths = SHARED_HEADER.unpack_from(mm, 0)
+        if magic != SHARED_MAGIC or generation == 0 or generation == _shared["generations"].get(section):
+            return None
+        buffer = generation % 2
+        offset = SHARED_HEADER_SIZE + buffer * capacity
+        try:
+            with memoryview(mm) as view:
+                loaded = json.loads(bytes(view[offset:offset + lengths[buffer]]))
+        except ValueError:
+            loaded = None  # Torn by a concurrent write; the generation check retries
+        if struct.unpack_from("<Q", mm, 8)[0] == generation and loaded is not None:
+            _shared["generations"][section] = generation
+            return loaded
+    return None
+
+def load_shared_snapshots():
+    """Apply any snapshots the leader published since the last check."""
+    for section in COLLECTORS:
+        loaded = read_shared_snapshot(section)
+        if loaded is not None:
+            polled = loaded["polled"]
+            apply_snapshot(section, Snapshot(**loaded["snapshot"]),
+                           set(polled) if polled is not None else None)
+
+async def worker_loop():
+    """Follow the leader's snapshots until this worker becomes the leader."""
+    while not try_become_leader():
+        load_shared_snapshots()
+        await asyncio.sleep(SHARED_SNAPSHOTS["check_interval"])
+    # Carry on from the last snapshots the previous leader wrote
+    load_shared_snapshots()
+    _shared["leader"] = True
+    app.logger.info("Worker %d is now the collector leader", os.getpid())
+    for section in COLLECTORS:
+        _collector_tasks.append(asyncio.create_task(collector_loop(section)))
+
+def release_shared_snapshots():
+    """Close the snapshot files and give up leadership."""
+    for mm in _shared["files"].values():
+        mm.close()
+    _shared["files"].clear()
+    _shared["generations"].clear()
+    if _shared["lock"] is not None:
+        os.close(_shared["lock"])
+    _shared.update(leader=False, lock=None)
+
+def get_worker_state():
+    return {
+        "pid": os.getpid(),
+        "shared": bool(SHARED_SNAPSHOTS["path"]),
+        "leader": _shared["leader"] or not SHARED_SNAPSHOTS["path"],
+        "generations": dict(_shared["generations"]),
+        "versions": {section: snapshot.version for section, snapshot in SNAPSHOTS.items()},
+    }
+
+# =============================================================================
+# AGENTS AND INGEST
+# =============================================================================
+
+# Sections an agent can poll and the central instance merges by site
+SITE_SECTIONS = ("services", "bmc", "snmp")
+
+# Service result fields an agent sends for each site
+SITE_SERVICE_FIELDS = ("status", "code", "response_time", "check_error", "cert_days")
+
+# Fields the cards, metrics and history read from each ingested target,
+# with their types; batches with targets missing any are rejected
+SITE_TARGET_FIELDS = {
+    "services": {"status": str},
+    "bmc": {"power": str, "health": str, "sensor_categories": dict, "storage": dict,
+            "sel_entries": list, "error": (str, type(None))},
+    "snmp": {"status": str, "health": str, "system": dict, "cpu": dict, "memory": dict,
+             "disks": list, "interfaces": list, "sensor_categories": dict,
+             "error": (str, type(None))},
+}
+
+# Agent state: the last batch sequence number, whether the next batch must
+# reset the central instance's view of this site, and delivery counters
+_agent = {
+    "seq": 0,
+    "need_reset": True,
+    "spool_bytes": 0,
+    "sent": 0,
+    "spooled": 0,
+    "dropped": 0,
+}
+
+# Central state per site: {site: {"seq", "last_seen", "batches", "targets",
+# "sections": {section: {target id: target}}}}
+_sites = {}
+# Each section's data as polled here, before site results are merged in
+_local_data = {}
+# Sections with ingested results not yet published
+_ingest_dirty = set()
+_ingest_wake = {"event": None}
+INGEST_STATS = {
+    "batches": 0,
+    "targets": 0,
+    "bytes": 0,
+    "duplicates": 0,
+    "resyncs": 0,
+    "rejected": 0,
+}
+
+def agent_target(section, target):
+    """The part of a target an agent sends, or None if it has no result yet."""
+    if section == "services":
+        if "status" not in target:
+            return None
+        return {field: target.get(field) for field in SITE_SERVICE_FIELDS}
+    return target
+
+def agent_deltas(events, full):
+    """Build (section, full, changed, removed) deltas from drained change events."""
+    deltas = []
+    for section in AGENT["sections"]:
+        entry = events.get(section)
+        snapshot = SNAPSHOTS.get(section)
+        if snapshot is None or not (full or entry):
+            continue
+        targets = snapshot_targets(section, snapshot.data)
+        if full or entry["resync"]:
+            ids, removed, section_full = targets, [], True
+        else:
+            ids, removed, section_full = entry["changed"], sorted(entry["removed"]), False
+        changed = {}
+        for target_id in ids:
+            target = agent_target(section, targets[target_id]) if target_id in targets else None
+            if target is not None:
+                changed[target_id] = target
+        deltas.append((section, section_full, changed, removed))
+    return deltas
+
+def split_agent_batches(deltas, limit):
+    """Pack deltas into batches of at most limit changed targets.
+
+    A section split across batches is only marked full in the first, so the
+    central instance replaces its view once and then adds the rest.
+    """
+    batches = [{}]
+    room = limit
+    for section, full, changed, removed in deltas:
+        part = {"full": full, "changed": {}, "removed": removed}
+        batches[-1][section] = part
+        for target_id, target in changed.items():
+            if room == 0:
+                part = {"full": False, "changed": {}, "removed": []}
+                batches.append({section: part})
+                room = limit
+            part["changed"][target_id] = target
+            room -= 1
+    return [batch for batch in batches if batch]
+
+def encode_agent_batch(sections, reset):
+    """Number and gzip one batch. Returns (seq, payload)."""
+    _agent["seq"] += 1
+    batch = {
+        "site": AGENT["site"],
+        "seq": _agent["seq"],
+        "reset": reset,
+        "ts": time.time(),
+        "sections": sections,
+    }
+    return _agent["seq"], gzip.compress(json.dumps(batch, separators=(",", ":"), default=str).encode(), 6)
+
+def _spool_names():
+    try:
+        return sorted(name for name in os.listdir(AGENT["spool_path"]) if name.endswith(".json.gz"))
+    except FileNotFoundError:
+        return []
+
+def spool_agent_batch(seq, payload):
+    """Keep an undelivered batch on disk, dropping the oldest past spool_max_bytes."""
+    os.makedirs(AGENT["spool_path"], exist_ok=True)
+    path = os.path.join(AGENT["spool_path"], f"{seq:012d}.json.gz")
+    with open(path + ".tmp", "wb") as f:
+        f.write(payload)
+    os.replace(path + ".tmp", path)
+    _agent["spool_bytes"] += len(payload)
+    _agent["spooled"] += 1
+    for name in _spool_names():
+        if _agent["spool_bytes"] <= AGENT["spool_max_bytes"]:
+            break
+        oldest = os.path.join(AGENT["spool_path"], name)
+        _agent["spool_bytes"] -= os.path.getsize(oldest)
+        os.remove(oldest)
+        _agent["dropped"] += 1
+
+def clear_agent_spool():
+    for name in _spool_names():
+        os.remove(os.path.join(AGENT["spool_path"], name))
+    _agent["spool_bytes"] = 0
+
+async def send_agent_batch(payload):
+    """Post one batch. Returns False if the central instance wants a resync."""
+    session = get_http_session("agent", AGENT["verify_ssl"])
+    async with session.post(urljoin(AGENT["central"], "/api/ingest"), data=payload,
+                            headers={"Content-Type": "application/json",
+                                     "Content-Encoding": "gzip",
+                                     "Authorization": f"Bearer {AGENT['token']}"},
+                            timeout=aiohttp.ClientTimeout(total=AGENT["timeout"])) as response:
+        if response.status == 409:
+            return False
+        if response.status == 503:
+            # A non-leader worker. The connection is already back in the
+            # pool, so drop the session (it only talks to central) or every
+            # retry would reach the same worker
+            await session.close()
+        response.raise_for_status()
+        return True
+
+async def deliver_agent_batches(batches):
+    """Send the spooled batches and then the new ones, in order.
+
+    Stops at the first failure and spools whatever is left. A resync
+    request makes everything queued obsolete, since the next batch resets
+    the site's view anyway.
+    """
+    queue = [(os.path.join(AGENT["spool_path"], name), None, None) for name in _spool_names()]
+    queue += [(None, seq, payload) for seq, payload in batches]
+    for i, (path, seq, payload) in enumerate(queue):
+        if payload is None:
+            with open(path, "rb") as f:
+                payload = f.read()
+        try:
+            accepted = await send_agent_batch(payload)
+        except Exception as e:
+            app.logger.warning("Can't deliver to %s: %s; spooling", AGENT["central"], str(e) or type(e).__name__)
+            for _, seq, payload in queue[i:]:
+                if seq is not None:
+                    spool_agent_batch(seq, payload)
+            return
+        if path is not None:
+            _agent["spool_bytes"] -= len(payload)
+            os.remove(path)
+        if not accepted:
+            app.logger.info("%s asked for a resync", AGENT["central"])
+            clear_agent_spool()
+            _agent["need_reset"] = True
+            return
+        _agent["sent"] += 1
+
+async def agent_loop():
+    """Poll this site's sections and push what changed to the central instance."""
+    subscriber = new_subscriber(set(AGENT["sections"]))
+    _event_subscribers.append(subscriber)
+    for section in AGENT["sections"]:
+        _collector_tasks.append(asyncio.create_task(collector_loop(section)))
+    last_sent = time.monotonic()
+    while True:
+        await asyncio.sleep(AGENT["flush_interval"])
+        reset = _agent["need_reset"]
+        events = drain_events(subscriber)
+        batches = split_agent_batches(agent_deltas(events, reset), AGENT["max_batch_targets"])
+        if not batches and (reset or time.monotonic() - last_sent >= AGENT["heartbeat"]):
+            batches = [{}]
+        if not batches:
+            continue
+        _agent["need_reset"] = False
+        await deliver_agent_batches([encode_agent_batch(batch, reset and i == 0)
+                                     for i, batch in enumerate(batches)])
+        last_sent = time.monotonic()
+
+async def run_agent():
+    """Run headless as a site agent until interrupted."""
+    spooled = _spool_names()
+    # Carry on numbering after batches still spooled from a previous run
+    _agent["seq"] = int(spooled[-1].split(".")[0]) if spooled else 0
+    _agent["spool_bytes"] = sum(os.path.getsize(os.path.join(AGENT["spool_path"], name)) for name in spooled)
+    open_history(backed=False)
+    app.logger.info("Agent for site %s reporting to %s", AGENT["site"], AGENT["central"])
+    try:
+        await agent_loop()
+    finally:
+        await stop_collectors()
+
+def decode_ingest_batch(payload, encoding):
+    """Decompress and parse an agent batch, raising ValueError if it's malformed."""
+    if encoding == "gzip":
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            payload = decompressor.decompress(payload, INGEST["max_bytes"])
+        except zlib.error as e:
+            raise ValueError(f"Bad gzip body: {e}")
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"Batch over {INGEST['max_bytes']} bytes")
+    batch = json.loads(payload)
+    if (not isinstance(batch, dict) or not isinstance(batch.get("seq"), int)
+            or not isinstance(batch.get("sections"), dict)):
+        raise ValueError("Batch needs seq and sections")
+    for section, delta in batch["sections"].items():
+        if section not in SITE_SECTIONS:
+            continue
+        if (not isinstance(delta, dict) or not isinstance(delta.get("changed", {}), dict)
+                or not isinstance(delta.get("removed", []), list)):
+            raise ValueError(f"Bad {section} delta")
+        for target_id, target in delta.get("changed", {}).items():
+            check_site_target(section, target_id, target)
+    return batch
+
+def check_site_target(section, target_id, target):
+    """Raise ValueError if an ingested target lacks what the section's views read."""
+    if not isinstance(target, dict):
+        raise ValueError(f"{section} target {target_id} isn't an object")
+    for field, kind in SITE_TARGET_FIELDS[section].items():
+        if not isinstance(target.get(field), kind):
+            raise ValueError(f"{section} target {target_id} has no valid {field}")
+    if section == "services" and target["status"] not in SERVICE_STATUSES:
+        raise ValueError(f"services target {target_id} has unknown status {target['status']}")
+
+def site_targets(section, site, targets):
+    """A site's targets in the shape of the section's snapshot data."""
+    if section == "services":
+        return {f"{name}@{site}": result for name, result in targets.items()}
+    return [{**device, "name": f"{name}@{site}", "site": site} for name, device in targets.items()]
+
+def ingest_batch(site, batch):
+    """Apply an agent's batch. Returns "ok", "duplicate" or "resync".
+
+    Batches must arrive in sequence; a gap (spooled batches the agent had
+    to drop, or a restart here) is answered with a resync request, and the
+    agent's next batch resets the site's view.
+    """
+    state = _sites.get(site)
+    seq = batch["seq"]
+    if batch.get("reset"):
+        if state is not None:
+            _ingest_dirty.update(state["sections"])
+        state = _sites[site] = {"seq": seq, "last_seen": None, "batches": 0, "targets": 0, "sections": {}}
+    elif state is None or seq > state["seq"] + 1:
+        INGEST_STATS["resyncs"] += 1
+        return "resync"
+    elif seq <= state["seq"]:
+        # Resent after a lost response
+        INGEST_STATS["duplicates"] += 1
+        return "duplicate"
+
+    ts = batch.get("ts") or time.time()
+    for section, delta in batch["sections"].items():
+        if section not in SITE_SECTIONS:
+            continue
+        targets = state["sections"].setdefault(section, {})
+        if delta.get("full"):
+            targets.clear()
+        for target_id in delta.get("removed") or ():
+            targets.pop(target_id, None)
+        changed = delta.get("changed") or {}
+        if section == "services":
+            changed = {name: {**result, "updated": ts} for name, result in changed.items()}
+        targets.update(changed)
+        record_snapshot_history(section, site_targets(section, site, changed), ts)
+        state["targets"] += len(changed)
+        INGEST_STATS["targets"] += len(changed)
+        _ingest_dirty.add(section)
+
+    state["seq"] = seq
+    state["last_seen"] = time.time()
+    state["batches"] += 1
+    INGEST_STATS["batches"] += 1
+    if _ingest_dirty:
+        ingest_wake().set()
+    return "ok"
+
+def merge_site_results(section, data):
+    """Merge every site's latest results into a section's locally polled data.
+
+    Devices from a site are added as "name@site". Services keep one target
+    each, listing the result from every site under "sites", with the worst
+    status of all as theirs.
+    """
+    if section != "services":
+        merged = list(data or [])
+        for site, state in sorted(_sites.items()):
+            merged.extend(site_targets(section, site, state["sections"].get(section, {})))
+        return merged
+
+    merged = dict(data or {})
+    for site, state in sorted(_sites.items()):
+        for name, result in state["sections"].get("services", {}).items():
+            entry = merged.get(name)
+            if entry is None or "sites" not in entry:
+                # Services nobody checks here take their first site's result
+                base = entry or {field: result.get(field) for field in SITE_SERVICE_FIELDS}
+                entry = merged[name] = {**base, "sites": {}}
+            entry["sites"][site] = result
+            if SERVICE_STATUSES.index(result["status"]) < SERVICE_STATUSES.index(entry["status"]):
+                entry["status"] = result["status"]
+    return merged
+
+def ingest_wake():
+    if _ingest_wake["event"] is None:
+        _ingest_wake["event"] = asyncio.Event()
+    return _ingest_wake["event"]
+
+async def ingest_publisher():
+    """Publish sections with newly ingested results, at most every publish_interval."""
+    while True:
+        await ingest_wake().wait()
+        # Let more batches arrive so they share one snapshot
+        await asyncio.sleep(INGEST["publish_interval"])
+        ingest_wake().clear()
+        sections = list(_ingest_dirty)
+        _ingest_dirty.clear()
+        for section in sections:
+            # History was recorded with each batch's own timestamp on ingest
+            publish_snapshot(section, _local_data.get(section), polled=set())
+
+def get_ingest_state():
+    now = time.time()
+    return {
+        "stats": dict(INGEST_STATS),
+        "sites": {
+            site: {
+                "seq": state["seq"],
+                "age": round(now - state["last_seen"], 1) if state["last_seen"] else None,
+                "batches": state["batches"],
+                "targets": state["targets"],
+                "sections": {section: len(targets) for section, targets in state["sections"].items()},
+            }
+            for site, state in sorted(_sites.items())
+        },
+    }
+
+# =============================================================================
+# ON-DEMAND POLLING
+# =============================================================================
+
+# In-flight on-demand poll per section
+_on_demand_polls = {}
+ON_DEMAND_STATS = {}
+
+# When each section's own targets were last polled. Ingested site results
+# publish snapshots too, so a snapshot's age says nothing about local data.
+_local_updated = {}
+
+async def _poll_on_demand(section):
+    try:
+        publish_snapshot(section, await COLLECTORS[section]())
+    except Exception as e:
+        app.logger.exception("Error collecting %s: %s", section, e)
+        ON_DEMAND_STATS[section]["errors"] += 1
+        publish_snapshot(section, None, error=str(e))
+    _local_updated[section] = time.time()
+    return SNAPSHOTS[section]
+
+async def collect_on_demand(section):
+    """Get a fresh snapshot, joining an in-flight poll rather than starting another."""
+    stats = ON_DEMAND_STATS.setdefault(section, {"polls": 0, "coalesced": 0, "fresh": 0, "errors": 0})
+    snapshot = SNAPSHOTS.get(section)
+    if snapshot is not None and time.time() - _local_updated.get(section, 0) < ON_DEMAND["fresh_for"]:
+        stats["fresh"] += 1
+        return snapshot
+
+    task = _on_demand_polls.get(section)
+    if task is None:
+        stats["polls"] += 1
+        task = _on_demand_polls[section] = asyncio.create_task(_poll_on_demand(section))
+        task.add_done_callback(lambda _: _on_demand_polls.pop(section, None))
+    else:
+        stats["coalesced"] += 1
+    # A request that goes away mustn't cancel the poll others are waiting on
+    return await asyncio.shield(task)
+
+async def get_snapshot(section):
+    """Get the latest snapshot for a section, waiting only for the very first poll."""
+    if ON_DEMAND["enabled"]:
+        return await collect_on_demand(section)
+    await _snapshot_event(section).wait()
+    return SNAPSHOTS[section]
+
+def snapshot_context(snapshot):
+    """Template variables describing how old a snapshot is."""
+    updated = datetime.fromtimestamp(snapshot.updated)
+    return {
+        "timestamp": updated.strftime("Status as of %B %d, %Y at %I:%M %p"),
+        "age": int(time.time() - snapshot.updated),
+        "updated": snapshot.updated,
+        "version": snapshot.version,
+        "epoch": snapshot.epoch,
+        "collector_error": snapshot.error,
+        # On-demand snapshots only change when a request polls, so there's
+        # nothing to push and pages must keep polling
+        "push_events": not ON_DEMAND["enabled"],
+    }
+
+@app.before_serving
+async def start_collectors():
+    """Start one background poller per section, or follow the leader's."""
+    if INGEST["tokens"]:
+        _collector_tasks.append(asyncio.create_task(ingest_publisher()))
+    if ON_DEMAND["enabled"]:
+        open_history()
+        return
+    if SHARED_SNAPSHOTS["path"]:
+        prepare_shared_path()
+        open_history(backed=False)
+        _collector_tasks.append(asyncio.create_task(worker_loop()))
+        return
+    open_history()
+    for section in COLLECTORS:
+        _collector_tasks.append(asyncio.create_task(collector_loop(section)))
+
+@app.after_serving
+async def stop_collectors():
+    """Cancel the background pollers."""
+    for task in list(_collector_tasks):
+        task.cancel()
+    await asyncio.gather(*_collector_tasks, return_exceptions=True)
+    _collector_tasks.clear()
+    release_shared_snapshots()
+    await close_http_sessions()
+    if IPMI_AVAILABLE:
+        await asyncio.get_running_loop().run_in_executor(None, close_ipmi_sessions)
+    close_history()
+
+# =============================================================================
+# PROMETHEUS METRICS
+# =============================================================================
+
+# Exposition text per section, rebuilt only when the snapshot version changes
+_metrics_cache = {}
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _metric_family(lines, name, kind, help_text, samples):
+    """Append one metric family from (labels, value) samples, skipping None values."""
+    samples = [(labels, value) for labels, value in samples if value is not None]
+    if not samples:
+        return
+    lines.append(f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n")
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {float(value)!r}\n")
+
+def _sensor_samples(devices):
+    return [
+        ({"device": device["name"], "category": category, "id": sensor["id"], "name": sensor["name"],
+          "units": sensor["units"]},
+         sensor["value"])
+        for device in devices if not device["error"]
+        for category, sensors in device["sensor_categories"].items()
+        for sensor in sensors
+        if isinstance(sensor["value"], (int, float))
+    ]
+
+def _services_metrics(lines, data):
+    targets = snapshot_targets("services", data)
+    _metric_family(lines, "servicemonitor_service_up", "gauge",
+                   "1 if the service answered with a non-error status.",
+                   [({"service": t["name"], "category": t["category"]}, t["status"] == "up")
+                    for t in targets.values() if "status" in t])
+    _metric_family(lines, "servicemonitor_service_response_seconds", "gauge",
+                   "Service check response time.",
+                   [({"service": t["name"], "category": t["category"]},
+                     t["response_time"] / 1000 if t.get("response_time") is not None else None)
+                    for t in targets.values()])
+    _metric_family(lines, "servicemonitor_service_phase_seconds", "gauge",
+                   "Service check time spent per phase: dns, connect, tls and ttfb.",
+                   [({"service": t["name"], "category": t["category"], "phase": phase},
+                     t["phases"][phase] / 1000 if t["phases"][phase] is not None else None)
+                    for t in targets.values() if t.get("phases")
+                    for phase in ("dns", "connect", "tls", "ttfb")])
+    _metric_family(lines, "servicemonitor_service_check_passed", "gauge",
+                   "1 if the service's status, body and certificate assertions passed.",
+                   [({"service": t["name"], "category": t["category"]}, not t["check_error"])
+                    for t in targets.values() if "check_error" in t])
+    _metric_family(lines, "servicemonitor_service_cert_expiry_days", "gauge",
+                   "Days until the service's TLS certificate expires.",
+                   [({"service": t["name"], "category": t["category"]}, t.get("cert_days"))
+                    for t in targets.values()])
+    _metric_family(lines, "servicemonitor_service_site_up", "gauge",
+                   "1 if the service answered with a non-error status from an agent's site.",
+                   [({"service": t["name"], "category": t["category"], "site": site}, result["status"] == "up")
+                    for t in targets.values() for site, result in t.get("sites", {}).items()])
+    _metric_family(lines, "servicemonitor_service_http_status", "gauge",
+                   "HTTP status code of the last service check.",
+                   [({"service": t["name"], "category": t["category"]}, t.get("code"))
+                    for t in targets.values()])
+
+def _proxmox_metrics(lines, data):
+    nodes = data["nodes"]
+    guests = data["vms"] + data["containers"]
+    _metric_family(lines, "servicemonitor_proxmox_cluster_up", "gauge",
+                   "1 if the cluster's API answered with its nodes.",
+                   [({"cluster": c["name"]}, not c["error"]) for c in data["clusters"]])
+    for field, metric, help_text in (
+        ("status", "up", "1 if the node is online."),
+        ("cpu_percent", "cpu_percent", "Node CPU usage."),
+        ("mem_percent", "memory_percent", "Node memory usage."),
+        ("disk_percent", "disk_percent", "Node root disk usage."),
+    ):
+        _metric_family(lines, f"servicemonitor_proxmox_node_{metric}", "gauge", help_text,
+                       [({"cluster": n["cluster"], "node": n["name"]},
+                         n[field] == "up" if field == "status" else n[field])
+                        for n in nodes])
+    for field, metric, help_text in (
+        ("status", "up", "1 if the guest is running."),
+        ("cpu_percent", "cpu_percent", "Guest CPU usage."),
+        ("mem_percent", "memory_percent", "Guest memory usage."),
+        ("disk_percent", "disk_percent", "Guest disk usage."),
+    ):
+        _metric_family(lines, f"servicemonitor_proxmox_guest_{metric}", "gauge", help_text,
+                       [({"cluster": g["cluster"], "vmid": g["vmid"], "name": g["name"],
+                          "type": g["type"], "node": g["node"]},
+                         g[field] == "up" if field == "status" else g[field])
+                        for g in guests])
+
+def _bmc_metrics(lines, data):
+    _metric_family(lines, "servicemonitor_redfish_up", "gauge",
+                   "1 if the Redfish API answered.",
+                   [({"device": d["name"]}, not d["error"]) for d in data])
+    _metric_family(lines, "servicemonitor_redfish_power_on", "gauge",
+                   "1 if the system is powered on.",
+                   [({"device": d["name"]}, d["power"] == "On") for d in data if not d["error"]])
+    _metric_family(lines, "servicemonitor_redfish_health_ok", "gauge",
+                   "1 if the system reports OK health.",
+                   [({"device": d["name"]}, d["health"] == "OK") for d in data if not d["error"]])
+    _metric_family(lines, "servicemonitor_redfish_sensor", "gauge",
+                   "Redfish sensor reading.", _sensor_samples(data))
+
+def _snmp_metrics(lines, data):
+    up = [d for d in data if not d["error"]]
+    _metric_family(lines, "servicemonitor_snmp_up", "gauge",
+                   "1 if the SNMP agent answered.",
+                   [({"device": d["name"]}, not d["error"]) for d in data])
+    _metric_family(lines, "servicemonitor_snmp_cpu_percent", "gauge",
+                   "Average processor load.",
+                   [({"device": d["name"]}, d["cpu"]["average"]) for d in up if d["cpu"]["count"]])
+    _metric_family(lines, "servicemonitor_snmp_memory_percent", "gauge",
+                   "Physical memory usage.",
+                   [({"device": d["name"]}, d["memory"]["percent"]) for d in up if d["memory"]["total"]])
+    _metric_family(lines, "servicemonitor_snmp_disk_percent", "gauge",
+                   "Fixed disk usage.",
+                   [({"device": d["name"], "mount": disk["mount"]}, disk["percent"])
+                    for d in up for disk in d["disks"]])
+    interfaces = [(d, iface) for d in up for iface in d["interfaces"]]
+    _metric_family(lines, "servicemonitor_snmp_interface_up", "gauge",
+                   "1 if the interface is operationally up.",
+                   [({"device": d["name"], "ifindex": i["index"], "interface": i["name"]}, i["status"] == "up")
+                    for d, i in interfaces])
+    for direction in ("in", "out"):
+        _metric_family(lines, f"servicemonitor_snmp_interface_{direction}_octets_total", "counter",
+                       f"Interface octets {'received' if direction == 'in' else 'sent'}.",
+                       [({"device": d["name"], "ifindex": i["index"], "interface": i["name"]},
+                         i[f"{direction}_octets"])
+                        for d, i in interfaces])
+    _metric_family(lines, "servicemonitor_ipmi_sensor", "gauge",
+                   "IPMI sensor reading.", _sensor_samples(up))
+
+METRIC_RENDERERS = {
+    "services": _services_metrics,
+    "proxmox": _proxmox_metrics,
+    "bmc": _bmc_metrics,
+    "snmp": _snmp_metrics,
+}
+
+def section_metrics(section, snapshot):
+    """Get the exposition text for a section, cached per snapshot version."""
+    cached = _metrics_cache.get(section)
+    if cached and cached[0] == snapshot.version:
+        return cached[1]
+    lines = []
+    if snapshot.data:
+        METRIC_RENDERERS[section](lines, snapshot.data)
+    text = "".join(lines)
+    _metrics_cache[section] = (snapshot.version, text)
+    return text
+
+def render_metrics():
+    """Render all sections from their latest snapshots without polling."""
+    now = time.time()
+    snapshots = [(section, SNAPSHOTS[section]) for section in COLLECTORS if section in SNAPSHOTS]
+    parts = [section_metrics(section, snapshot) for section, snapshot in snapshots]
+    lines = []
+    _metric_family(lines, "servicemonitor_snapshot_age_seconds", "gauge",
+                   "Seconds since the section was last collected.",
+                   [({"section": section}, now - snapshot.updated) for section, snapshot in snapshots])
+    _metric_family(lines, "servicemonitor_snapshot_version", "gauge",
+                   "Number of snapshots published for the section.",
+                   [({"section": section}, snapshot.version) for section, snapshot in snapshots])
+    _metric_family(lines, "servicemonitor_on_demand_requests_total", "counter",
+                   "Requests for a section in on-demand mode, by how they were served.",
+                   [({"section": section, "result": result}, count)
+                    for section, stats in ON_DEMAND_STATS.items()
+                    for result, count in stats.items() if result != "errors"])
+    _metric_family(lines, "servicemonitor_site_last_seen_seconds", "gauge",
+                   "Seconds since the site's agent last delivered a batch.",
+                   [({"site": site}, now - state["last_seen"]) for site, state in _sites.items()
+                    if state["last_seen"]])
+    _metric_family(lines, "servicemonitor_ingest_targets_total", "counter",
+                   "Target results ingested from site agents.",
+                   [({}, INGEST_STATS["targets"])] if INGEST["tokens"] else [])
+    concurrency = get_poll_concurrency_stats()["subsystems"]
+    _metric_family(lines, "servicemonitor_poll_running", "gauge",
+                   "Target polls currently holding a concurrency slot.",
+                   [({"subsystem": subsystem}, stats["running"]) for subsystem, stats in concurrency.items()])
+    _metric_family(lines, "servicemonitor_poll_queue_depth", "gauge",
+                   "Target polls waiting for a concurrency slot.",
+                   [({"subsystem": subsystem}, stats["queued"]) for subsystem, stats in concurrency.items()])
+    _metric_family(lines, "servicemonitor_poll_started_total", "counter",
+                   "Target polls started.",
+                   [({"subsystem": subsystem}, stats["started"]) for subsystem, stats in concurrency.items()])
+    _metric_family(lines, "servicemonitor_poll_wait_seconds_total", "counter",
+                   "Total time target polls spent waiting for a concurrency slot.",
+                   [({"subsystem": subsystem}, stats["wait_total"] / 1000) for subsystem, stats in concurrency.items()])
+    return "".join(parts + lines)
+
+# =============================================================================
+# FRAGMENT CACHE
+# =============================================================================
+
+# (section, target id) -> (data digest, rendered fragment)
+_fragments = OrderedDict()
+FRAGMENT_STATS = {
+    "hits": 0,
+    "misses": 0,
+    "uncacheable": 0,
+    "evictions": 0,
+    "bytes": 0,
+}
+
+async def _render_target(section, target_id, target):
+    if section == "services":
+        return await render_template("partials/service_tile.html", name=target["name"], status=target)
+    if section == "proxmox":
+        if target_id.startswith("node:"):
+            return await render_template("partials/node_card.html", node=target)
+        return await render_template("partials/vm_card.html", vm=target)
+    return await render_template(f"partials/{section}_card.html", device=target)
+
+async def render_target(section, target_id, target, version):
+    """Render the HTML fragment for one target of a snapshot version.
+
+    The fragment is reused while the target's data digest, kept by
+    track_target_changes, is unchanged.
+    """
+    tracked = _target_versions.get(section, {}).get(target_id)
+    if tracked is None or tracked[0] > version:
+        # Changed after this snapshot, so the digest describes newer data
+        FRAGMENT_STATS["uncacheable"] += 1
+        return Markup(await _render_target(section, target_id, target))
+
+    key = (section, target_id)
+    cached = _fragments.get(key)
+    if cached is not None and cached[0] == tracked[1]:
+        FRAGMENT_STATS["hits"] += 1
+        _fragments.move_to_end(key)
+        return cached[1]
+
+    FRAGMENT_STATS["misses"] += 1
+    html = Markup(await _render_target(section, target_id, target))
+    if cached is not None:
+        FRAGMENT_STATS["bytes"] -= len(cached[1])
+    _fragments[key] = (tracked[1], html)
+    _fragments.move_to_end(key)
+    FRAGMENT_STATS["bytes"] += len(html)
+    while _fragments and (len(_fragments) > FRAGMENT_CACHE["max_entries"]
+                          or FRAGMENT_STATS["bytes"] > FRAGMENT_CACHE["max_bytes"]):
+        _, (_, evicted) = _fragments.popitem(last=False)
+        FRAGMENT_STATS["bytes"] -= len(evicted)
+        FRAGMENT_STATS["evictions"] += 1
+    return html
+
+async def render_fragments(section, snapshot, services=None):
+    """Render the targets of a snapshot: {target id: fragment}.
+
+    For the services section, services limits rendering to those names.
+    """
+    if services is not None:
+        categories = _status_index["categories"]
+        targets = {name: service_target(name, categories[name], SERVICES[categories[name]][name],
+                                        snapshot.data or {})
+                   for name in services}
+    else:
+        targets = snapshot_targets(section, snapshot.data)
+    return {target_id: await render_target(section, target_id, target, snapshot.version)
+            for target_id, target in targets.items()}
+
+def get_fragment_stats():
+    lookups = FRAGMENT_STATS["hits"] + FRAGMENT_STATS["misses"]
+    return {
+        **FRAGMENT_STATS,
+        "entries": len(_fragments),
+        "hit_rate": round(FRAGMENT_STATS["hits"] / lookups, 3) if lookups else 0,
+    }
+
 # =============================================================================
 # ROUTES
 # =============================================================================
 
 @app.route('/')
 async def dashboard():
-    """Main dashboard showing internet service status."""
-    await check_services_async()
-    now = datetime.now().strftime("Status as of %B %d, %Y at %I:%M %p")
+    """Main dashboard showing internet service status.
+
+    Takes the same filter, sort and page parameters as /api/services.
+    """
+    snapshot = await get_snapshot("services")
+    query = service_query_args(request.args)
+    names = query_services(snapshot.data, query["statuses"], query["categories"],
+                           query["search"], query["sort"])
+    total = len(names)
+    names, page, pages = paginate(names, query["page"], query["per_page"])
+
+    # Configuration order keeps the category grouping; other orders are flat
+    if query["sort"] is None:
+        groups = []
+        for name in names:
+            category = _status_index["categories"][name]
+            if not groups or groups[-1][0] != category:
+                groups.append((category, []))
+            groups[-1][1].append(name)
+    else:
+        groups = [(None, names)]
+
+    args = {key: value for key, value in request.args.items() if key != "page"}
     return await render_template('dashboard.html',
-                                  SERVICES=SERVICES,
-                                  STATUS=STATUS,
-                                  timestamp=now,
-                                  active_page='services')
+                                  groups=groups,
+                                  summary=services_summary(),
+                                  query=query,
+                                  total=total,
+                                  page=page,
+                                  pages=pages,
+                                  page_urls={n: url_for('dashboard', **args, page=n)
+                                             for n in (page - 1, page + 1) if 1 <= n <= pages},
+                                  filtered=any(args.get(key) for key in ("status", "category", "q", "sort")),
+                                  fragments=await render_fragments("services", snapshot, names),
+                                  active_page='services',
+                                  section='services',
+                                  **snapshot_context(snapshot))
 
 @app.route('/proxmox')
 async def proxmox():
     """Proxmox cluster status page."""
-    nodes_raw, vms_raw = await get_proxmox_data()
-
-    # Process node data
-    nodes = [process_node_data(n) for n in nodes_raw]
-    nodes.sort(key=lambda x: x["name"])
-
-    # Process VM/container data
-    vms = [process_vm_data(v) for v in vms_raw]
-    vms.sort(key=lambda x: (x["node"], x["name"]))
-
-    # Separate VMs and containers
-    qemu_vms = [v for v in vms if v["type"] == "qemu"]
-    lxc_cts = [v for v in vms if v["type"] == "lxc"]
-
-    now = datetime.now().strftime("Status as of %B %d, %Y at %I:%M %p")
+    snapshot = await get_snapshot("proxmox")
+    data = snapshot.data or {"clusters": [], "nodes": [], "vms": [], "containers": []}
+    clusters = {c["name"]: {**c, "nodes": [], "vms": [], "containers": []} for c in data["clusters"]}
+    for kind in ("nodes", "vms", "containers"):
+        for item in data[kind]:
+            clusters[item["cluster"]][kind].append(item)
 
     return await render_template('proxmox.html',
-                                  nodes=nodes,
-                                  vms=qemu_vms,
-                                  containers=lxc_cts,
-                                  timestamp=now,
+                                  clusters=list(clusters.values()),
+                                  fragments=await render_fragments("proxmox", snapshot),
                                   active_page='proxmox',
-                                  error=None if nodes else "Unable to connect to Proxmox API")
+                                  section='proxmox',
+                                  error=None if clusters else "No Proxmox clusters configured",
+                                  **snapshot_context(snapshot))
 
 @app.route('/bmc')
 async def bmc():
     """BMC/Redfish status page."""
-    devices = await get_all_bmc_data()
-    now = datetime.now().strftime("Status as of %B %d, %Y at %I:%M %p")
+    snapshot = await get_snapshot("bmc")
+    devices = snapshot.data or []
 
     return await render_template('bmc.html',
                                   devices=devices,
-                                  timestamp=now,
+                                  fragments=await render_fragments("bmc", snapshot),
                                   active_page='bmc',
-                                  error=None if devices else "No BMC devices configured")
+                                  section='bmc',
+                                  error=None if devices else "No BMC devices configured",
+                                  **snapshot_context(snapshot))
 
 @app.route('/snmp')
 async def snmp():
     """SNMP monitoring page."""
-    devices = await get_all_snmp_data()
-    now = datetime.now().strftime("Status as of %B %d, %Y at %I:%M %p")
+    snapshot = await get_snapshot("snmp")
+    devices = snapshot.data or []
 
     return await render_template('snmp.html',
                                   devices=devices,
-                                  timestamp=now,
+                                  fragments=await render_fragments("snmp", snapshot),
                                   active_page='snmp',
-                                  error=None if devices else "No SNMP devices configured")
+                                  section='snmp',
+                                  error=None if devices else "No SNMP devices configured",
+                                  **snapshot_context(snapshot))
+
+@app.route('/api/<section>')
+async def api_section(section):
+    """Section snapshot as JSON.
+
+    ?since=<version>&epoch=<epoch> returns only targets changed after that
+    version, and ?html=1 adds each target's rendered fragment. A since from
+    another epoch (before a restart) gets the full snapshot. Responses
+    carry a strong ETag of the epoch and version, so unchanged polls get a
+    304.
+
+    /api/services also takes ?status=, ?category= (comma-separated), ?q=
+    and ?sort= filters, and ?page= and ?per_page= for paginated listings.
+    It always includes the status summary.
+    """
+    if section not in COLLECTORS:
+        abort(404)
+    snapshot = await get_snapshot(section)
+    since = request.args.get("since", None, type=int)
+    with_html = request.args.get("html", "0") == "1"
+
+    # Versions from another epoch can't be diffed against
+    full = (since is None or request.args.get("epoch") != snapshot.epoch
+            or since > snapshot.version)
+    etag = f"{section}-{snapshot.epoch}-{snapshot.version}"
+    if not full:
+        etag += f"-since-{since}"
+    if with_html:
+        etag += "-html"
+    listing_args = {key: value for key, value in request.args.items()
+                    if key in ("status", "category", "q", "sort", "page", "per_page")}
+    if section == "services" and listing_args:
+        etag += "-" + hashlib.sha1(json.dumps(listing_args, sort_keys=True).encode()).hexdigest()[:16]
+    if request.if_none_match.contains(etag):
+        response = await make_response("", 304)
+        response.set_etag(etag)
+        return response
+
+    targets = snapshot_targets(section, snapshot.data)
+    if full:
+        changed, removed = list(targets), []
+    else:
+        changed, removed = changed_targets(section, since)
+
+    listing = {}
+    # Changes anywhere still move the summary and category counts
+    all_changed = changed
+    if section == "services" and listing_args:
+        query = service_query_args(request.args)
+        matches = query_services(snapshot.data, query["statuses"], query["categories"],
+                                 query["search"], query["sort"])
+        if "page" in listing_args or "per_page" in listing_args:
+            order, page, pages = paginate(matches, query["page"], query["per_page"])
+            listing = {"order": order, "total": len(matches), "page": page, "pages": pages}
+        else:
+            order = matches
+            listing = {"order": order, "total": len(matches)}
+        if full:
+            changed = order
+        else:
+            # Only the view's own tiles. A target moving into or out of the
+            # view changes its order, which tells the client to re-render.
+            shown = set(order)
+            changed = [target_id for target_id in changed if target_id in shown]
+
+    body = {
+        "section": section,
+        "epoch": snapshot.epoch,
+        "version": snapshot.version,
+        "updated": snapshot.updated,
+        "timestamp": snapshot_context(snapshot)["timestamp"],
+        "error": snapshot.error,
+        "full": full,
+        "targets": {target_id: targets[target_id] for target_id in changed},
+        "removed": removed,
+        **listing,
+    }
+    if section == "services":
+        body["summary"] = services_summary()
+    if section == "proxmox" and snapshot.data:
+        body["clusters"] = snapshot.data["clusters"]
+    if with_html:
+        body["html"] = {
+            target_id: await render_target(section, target_id, targets[target_id], snapshot.version)
+            for target_id in changed
+        }
+        if section == "services" and all_changed:
+            body["html"]["@summary"] = await render_template("partials/service_summary.html",
+                                                             summary=body["summary"])
+        if listing and not full and query["sort"] is None:
+            # Category headers on the page whose counts may have moved
+            categories = _status_index["categories"]
+            shown = {categories.get(name) for name in listing["order"]}
+            for category in sorted({categories.get(name) for name in all_changed} & shown - {None}):
+                body["html"][f"@category:{category}"] = await render_template(
+                    "partials/category_counts.html", category=category,
+                    counts=body["summary"]["categories"][category])
+
+    response = await make_response(body)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/api/ingest', methods=['POST'])
+async def api_ingest():
+    """Accept a gzipped batch of result deltas from a site agent.
+
+    Answers 409 when the batch doesn't follow the site's last one, asking
+    the agent to resync with a reset batch.
+    """
+    if not INGEST["tokens"]:
+        abort(404)
+    if SHARED_SNAPSHOTS["path"] and not _shared["leader"] and not ON_DEMAND["enabled"]:
+        # Only the leader publishes snapshots; the agent spools and retries.
+        # Closing the connection lets its retry land on another worker.
+        return ({"error": "Not the collector leader"}, 503,
+                {"Retry-After": "1", "Connection": "close"})
+    authorization = request.headers.get("Authorization", "")
+    site = next((site for site, token in INGEST["tokens"].items()
+                 if hmac.compare_digest(authorization, f"Bearer {token}")), None)
+    if site is None:
+        INGEST_STATS["rejected"] += 1
+        return {"error": "Unknown token"}, 403
+    payload = await request.get_data(cache=False)
+    INGEST_STATS["bytes"] += len(payload)
+    try:
+        batch = decode_ingest_batch(payload, request.headers.get("Content-Encoding"))
+    except ValueError as e:
+        INGEST_STATS["rejected"] += 1
+        return {"error": str(e)}, 400
+    if batch.get("site") != site:
+        INGEST_STATS["rejected"] += 1
+        return {"error": f"Token is for site {site}"}, 403
+    result = ingest_batch(site, batch)
+    if result == "resync":
+        return {"resync": True}, 409
+    return {"seq": batch["seq"], "duplicate": result == "duplicate"}
+
+@app.route('/api/events')
+async def api_events():
+    """Server-Sent Events stream of per-target changes.
+
+    ?section= limits the stream to one section (repeatable); the default is
+    every section.
+    """
+    sections = set(request.args.getlist("section")) or set(COLLECTORS)
+    if not sections <= set(COLLECTORS):
+        abort(404)
+    response = await make_response(event_stream(new_subscriber(sections)), {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    response.timeout = None
+    return response
+
+@app.route('/api/history')
+async def api_history():
+    """Metric history as JSON.
+
+    Without ?series= lists known series (filtered by ?prefix=); with it,
+    returns records at ?step= seconds (0 = raw) newer than ?since=.
+    """
+    key = request.args.get("series")
+    if key is None:
+        prefix = request.args.get("prefix", "")
+        open_history()
+        return {
+            "series": sorted(k for k in _history["series"] if k.startswith(prefix)),
+            "stats": get_history_stats(),
+        }
+    step = request.args.get("step", 0, type=int)
+    since = request.args.get("since", None, type=float)
+    return {
+        "series": key,
+        "step": step,
+        "records": [
+            {"ts": ts, "avg": avg, "min": low, "max": high}
+            for ts, avg, low, high in get_history(key, step, since)
+        ],
+    }
+
+@app.route('/metrics')
+async def metrics():
+    """Prometheus exposition of the latest snapshots."""
+    return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+@app.route('/debug/on-demand')
+async def debug_on_demand():
+    """On-demand poll, coalesced and served-fresh counts per section as JSON."""
+    return {"enabled": ON_DEMAND["enabled"], "fresh_for": ON_DEMAND["fresh_for"],
+            "in_flight": sorted(_on_demand_polls), "sections": ON_DEMAND_STATS}
+
+@app.route('/debug/ingest')
+async def debug_ingest():
+    """Agent ingest counters and per-site state as JSON."""
+    return get_ingest_state()
+
+@app.route('/debug/pool')
+async def debug_pool():
+    """Connection pool statistics as JSON."""
+    return get_pool_stats()
+
+@app.route('/debug/concurrency')
+async def debug_concurrency():
+    """Poll concurrency limits, queue depth and wait times as JSON."""
+    return get_poll_concurrency_stats()
+
+@app.route('/debug/worker')
+async def debug_worker():
+    """This worker's leadership and shared snapshot state as JSON."""
+    return get_worker_state()
+
+@app.route('/debug/scheduler')
+async def debug_scheduler():
+    """Per-target scheduler state as JSON."""
+    return get_schedule_state()
+
+@app.route('/debug/timings')
+async def debug_timings():
+    """Per-target poll timings, slowest p99 first. Add ?format=json for JSON."""
+    timings = get_timings()
+    if request.args.get("format") == "json":
+        return {"buckets": list(TIMING_BUCKETS), "window": TIMING_WINDOW, "timings": timings}
+    return await render_template('timings.html',
+                                 active_page='timings',
+                                 timings=timings,
+                                 window=TIMING_WINDOW,
+                                 timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+@app.route('/debug/fragments')
+async def debug_fragments():
+    """Rendered fragment cache statistics as JSON."""
+    return get_fragment_stats()
+
+@app.route('/debug/redfish-cache')
+async def debug_redfish_cache():
+    """Redfish response cache statistics as JSON."""
+    return get_redfish_cache_stats()
 
 # =============================================================================
 # MAIN
 # =============================================================================
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    if AGENT["central"]:
+        asyncio.run(run_agent())
+    else:
+        app.run(host="0.0.0.0", port=5000)